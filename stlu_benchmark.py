@@ -0,0 +1,149 @@
+import csv
+import json
+import time
+import argparse
+import numpy as np
+from stlu_grammar import *
+from stlu_trace import Trace
+from stlu_scorer import qualitativescore, quantitativescore, smartscore
+from stlu_compiler import compile
+from stlu_node_robustness import umonitor, umonitor_signal
+from stlu_chunked import requirement_horizon
+"""
+File summary
+In this file, we will time the parser and the scorers over a grid of trace lengths, window widths and formula depths,
+with formulas from stl_generator and random-walk traces, both seeded so that two runs measure the same work.
+Every measurement is one row (engine, length, width, depth, formula, seconds per call) written as JSON or CSV.
+Every engine but the parsers computes the robustness (or satisfaction) of every time point of the trace, so the
+engines do the same work and the trace length counts for all of them: the scalar scorers are called at every t,
+umonitor at every t of its horizon (it cannot read past the end of the trace), umonitor_signal and compiled plans
+(compiled once, outside the timing) return the whole signal. The scalar scorers cost about length * width ** depth,
+keep the grid small.
+"""
+
+scorers = {"qualitativescore": qualitativescore, "quantitativescore": quantitativescore, "smartscore": smartscore}
+
+engines = ["parse", "parse_fast", "qualitativescore", "quantitativescore", "smartscore", "umonitor", "umonitor_signal", "compile"]
+
+
+"""Run the grid, one row per (engine, length, width, depth, formula). By default formulas use temporal operators,
+conjunction and negation (ops) and no ==, so every engine, umonitor included, can evaluate them."""
+def benchmark(lengths=(100, 1000), widths=(5, 20), depths=(1, 2), formulas=3, repeat=3, seed=0, cl=0.95,
+              ops=None, engines=engines):
+    ops = {"G": 1, "E": 1, "U": 1, "&": 1, "!": 1} if ops is None else ops
+    rows = []
+    for length in lengths:
+        (trace, omega) = random_trace(length, seed)
+        for width in widths:
+            for depth in depths:
+                for i in range(formulas):
+                    text = stl_generator(depth, seed="{}-{}-{}-{}".format(seed, width, depth, i), ops=ops,
+                                         width=(width - 1, width - 1), start=(0, 0), values=(0, 1), relops=(">", ">=", "<", "<="))
+                    for engine in engines:
+                        row = dict(engine=engine, length=length, width=width, depth=depth, formula=text, repeat=repeat)
+                        try:
+                            row["seconds"] = timeit(runner(engine, text, trace, omega, cl), repeat)
+                        except Exception as e:
+                            row["error"] = "{}: {}".format(type(e).__name__, e)
+                        rows.append(row)
+    return rows
+
+
+"""Seeded random walk trace: the Trace of its means for the scorers and the (T, 2) (mean, sigma) array for umonitor"""
+def random_trace(length, seed=0):
+    rng = np.random.default_rng(seed)
+    mean = np.cumsum(rng.normal(0, 0.1, length))
+    sigma = np.abs(rng.normal(0, 0.1, length))
+    return Trace({"x": mean}), np.stack([mean, sigma], axis=1)
+
+
+"""Best wall time of repeat calls of fn, in seconds"""
+def timeit(fn, repeat=3):
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def runner(engine, text, trace, omega, cl):
+    if engine == "parse":
+        return lambda: parse(text)
+    elif engine == "parse_fast":
+        return lambda: parse_fast(text)
+    stl = parse(text)
+    if engine in scorers:
+        score = scorers[engine]
+        return lambda: [score(stl, trace, t) for t in range(len(trace))]
+    elif engine == "umonitor":
+        requirement = to_requirement(stl, omega, cl)
+        defined = range(len(omega) - requirement_horizon(requirement))
+        return lambda: [umonitor(requirement, t) for t in defined]
+    elif engine == "umonitor_signal":
+        requirement = to_requirement(stl, omega, cl)
+        return lambda: umonitor_signal(requirement)
+    elif engine == "compile":
+        plan = compile(stl)
+        return lambda: plan(trace)
+    raise ValueError("Unknown engine {}".format(engine))
+
+
+"""umonitor requirement of a parsed formula whose constraints compare a signal with a number: x > c is the mu of
+threshold c and x < c its negation. Or and implies go through negation and conjunction. Until keeps the umonitor
+semantics (only the window), so its values can differ from quantitativescore; the work timed is the same."""
+def to_requirement(stl, omega, cl):
+    if isinstance(stl, Formula):
+        return to_requirement(stl.subformula, omega, cl)
+    elif isinstance(stl, (Globally, Eventually)):
+        (left, right) = stl.interval
+        return ("always" if isinstance(stl, Globally) else "eventually", (int(left), int(right))), to_requirement(stl.subformula, omega, cl)
+    elif isinstance(stl, Until):
+        (left, right) = stl.interval
+        return ("until", (int(left), int(right))), (to_requirement(stl.left, omega, cl), to_requirement(stl.right, omega, cl))
+    elif isinstance(stl, And):
+        return ("and",), (to_requirement(stl.left, omega, cl), to_requirement(stl.right, omega, cl))
+    elif isinstance(stl, Or):
+        return _neg((("and",), (_neg(to_requirement(stl.left, omega, cl)), _neg(to_requirement(stl.right, omega, cl)))))
+    elif isinstance(stl, Implies):
+        return _neg((("and",), (to_requirement(stl.left, omega, cl), _neg(to_requirement(stl.right, omega, cl)))))
+    elif isinstance(stl, Not):
+        return _neg(to_requirement(stl.subformula, omega, cl))
+    elif isinstance(stl, Constraint) and isinstance(stl.term, Var) and stl.relop in (">", ">=", "<", "<="):
+        mu = (("mu", omega), (float(stl.bound.name if isinstance(stl.bound, Var) else stl.bound), cl))
+        return mu if stl.relop in (">", ">=") else _neg(mu)
+    raise NotImplementedError("No umonitor requirement for {} of class {}".format(stl, stl.__class__))
+
+
+def _neg(requirement):
+    return ("neg",), requirement
+
+
+def write_json(rows, path):
+    with open(path, "w") as f:
+        json.dump(rows, f, indent=1)
+
+
+def write_csv(rows, path):
+    fields = ["engine", "length", "width", "depth", "formula", "repeat", "seconds", "error"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the STLU parser and scorers")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--widths", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--formulas", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", nargs="+", default=engines, choices=engines)
+    parser.add_argument("--out", default="benchmark.json", help="results file, .csv for CSV, JSON otherwise")
+    args = parser.parse_args()
+    rows = benchmark(args.lengths, args.widths, args.depths, args.formulas, args.repeat, args.seed, engines=args.engines)
+    (write_csv if args.out.endswith(".csv") else write_json)(rows, args.out)
+    for row in rows:
+        print("{:>18} T={:<7} W={:<4} depth={} {}".format(row["engine"], row["length"], row["width"], row["depth"], row.get("seconds", row.get("error"))))
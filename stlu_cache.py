@@ -0,0 +1,135 @@
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from stlu_grammar import *
+from stlu_trace import Trace
+"""
+File summary
+In this file, we will keep robustness results on disk across sessions. An entry is addressed by the hash of what
+produced it: the formula (node types and values, so Var('x') and Atom('x') differ), the trace buffers and the
+parameter values. Entries are .npy files read back memory-mapped, the least recently used ones are removed once the
+cache is over its disk budget, down to 90% of it so that one eviction makes room for many puts. The recency order
+is kept in memory, read once from the modification times when the cache is opened. Plan.__call__, quantitativescore_batch, umonitor_signal and synthSTLParam take a
+cache argument; with a cache they return read-only arrays, computed or not.
+"""
+
+
+class DiskCache(object):
+    def __init__(self, directory, budget=1 << 30, lowwater=0.9):
+        self.directory = directory
+        self.budget = budget
+        self.lowwater = lowwater
+        os.makedirs(directory, exist_ok=True)
+        # path -> size, least recently used first
+        self.index = OrderedDict()
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        for (mtime, path, size) in sorted(entries):
+            self.index[path] = size
+        self.size = sum(self.index.values())
+
+    """Content hash of the parts of a computation, e.g. key("plan", formula, trace, valuemap)"""
+    def key(self, *parts):
+        h = hashlib.sha256()
+        for part in parts:
+            _feed(h, part)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    """The cached array (read-only, memory-mapped) or None"""
+    def get(self, key):
+        path = self.path(key)
+        try:
+            value = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # the modification time orders the entries for eviction when the cache is opened again
+        os.utime(path)
+        if path in self.index:
+            self.index.move_to_end(path)
+        return value
+
+    def put(self, key, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(value))
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        self.size += size - self.index.pop(path, 0)
+        self.index[path] = size
+        if self.size > self.budget:
+            self.evict()
+
+    """Remove least recently used entries until the cache fits in lowwater * budget"""
+    def evict(self):
+        while self.index and self.size > self.lowwater * self.budget:
+            (path, size) = self.index.popitem(last=False)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.size -= size
+
+    def clear(self):
+        for path in self._entries():
+            os.remove(path)
+        self.index.clear()
+        self.size = 0
+
+    """Cached value of compute() under key, a read-only ndarray whether it was computed or read back (a hit is a
+    plain view on the memory map, a miss a view on the computed array, which stays writable for its owner)"""
+    def fetch(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = np.asarray(compute())
+            self.put(key, value)
+        value = value.view(np.ndarray)
+        value.setflags(write=False)
+        return value
+
+    def _entries(self):
+        for (root, dirs, files) in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".npy"):
+                    yield os.path.join(root, name)
+
+
+"""Feed a canonical serialization of obj to the hash: formula nodes with their types, traces and arrays with
+dtype, shape and bytes, dicts sorted by key, numbers by their float value (1 and 1.0 give the same key)"""
+def _feed(h, obj):
+    if isinstance(obj, Trace):
+        h.update(b"Trace")
+        _feed(h, obj.time)
+        _feed(h, obj.signals)
+        if obj.interpolation is not None:
+            _feed(h, obj.interpolation)
+    elif isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        h.update("ndarray {} {}".format(obj.dtype.str, obj.shape).encode())
+        h.update(obj.data if obj.size else b"")
+    elif isinstance(obj, dict):
+        h.update("dict {}".format(len(obj)).encode())
+        for k in sorted(obj, key=repr):
+            _feed(h, k)
+            _feed(h, obj[k])
+    elif isinstance(obj, (tuple, list)):
+        h.update("{} {} (".format(type(obj).__name__, len(obj)).encode())
+        for child in obj:
+            _feed(h, child)
+        h.update(b")")
+    elif isinstance(obj, (float, int, np.number)) and not isinstance(obj, bool):
+        h.update("number {!r}".format(float(obj)).encode())
+    elif obj is None or isinstance(obj, (str, bool)):
+        h.update("{} {!r}".format(type(obj).__name__, obj).encode())
+    else:
+        raise TypeError("Cannot hash {} of class {}".format(obj, obj.__class__))
@@ -0,0 +1,144 @@
+import numpy as np
+from stlu_grammar import *
+from stlu_compiler import compile, Plan
+from stlu_trace import Trace
+from stlu_node_robustness import umonitor_signal, map_requirement
+"""
+File summary
+In this file, we will evaluate formulas over traces that do not fit in memory, e.g. np.load(..., mmap_mode='r') arrays.
+The robustness at t only reads the samples in [t + lookback, t + horizon] (the extent of the formula), so the trace
+is cut into chunks and each chunk is evaluated on a slice that reaches that far past both of its ends. Inside the
+slice every window sees the same samples as on the whole trace, or is cut by the true end of the trace at the same
+place, so the chunks stitch back together exactly. Chunks are independent and can run on an executor.
+Time is in samples, like Trace.fromarray and umonitor.
+"""
+
+
+"""Time offsets (lo, hi) relative to t of the samples the robustness at t can read. Parametric bounds take their
+value from valuemap, or the widest end of their range."""
+def extent(stl, valuemap=None):
+    valuemap = valuemap or {}
+    if isinstance(stl, Formula):
+        return extent(stl.subformula, valuemap)
+    elif isinstance(stl, (Globally, Eventually)):
+        (a, b) = _bounds(stl.interval, valuemap)
+        (lo, hi) = extent(stl.subformula, valuemap)
+        return a + lo, b + hi
+    elif isinstance(stl, Until):
+        # the compiled until also reads the right operand at t itself
+        (a, b) = _bounds(stl.interval, valuemap)
+        (lo1, hi1) = extent(stl.left, valuemap)
+        (lo2, hi2) = extent(stl.right, valuemap)
+        return min(a, 0) + min(lo1, lo2), max(b, 0) + max(hi1, hi2)
+    elif isinstance(stl, (Or, And, Implies)):
+        (lo1, hi1) = extent(stl.left, valuemap)
+        (lo2, hi2) = extent(stl.right, valuemap)
+        return min(lo1, lo2), max(hi1, hi2)
+    elif isinstance(stl, Not):
+        return extent(stl.subformula, valuemap)
+    return 0, 0
+
+
+def _bounds(interval, valuemap):
+    (left, right) = interval
+    if isinstance(left, Param):
+        left = valuemap.get(left.name, left.left)
+    if isinstance(right, Param):
+        right = valuemap.get(right.name, right.right)
+    return float(left), float(right)
+
+
+"""Maximum look-ahead of a formula: the robustness at t is known once t + horizon has been sampled"""
+def horizon(stl, valuemap=None):
+    return max(extent(stl, valuemap)[1], 0)
+
+
+"""Maximum look-back of a formula (non-zero only with negative interval bounds)"""
+def lookback(stl, valuemap=None):
+    return max(-extent(stl, valuemap)[0], 0)
+
+
+"""extent for a umonitor requirement, windows (t1, t2) in samples"""
+def requirement_extent(requirement):
+    req = requirement[0]
+    varphi = requirement[1]
+    if req[0] == "mu":
+        return 0, 0
+    elif req[0] == "neg":
+        return requirement_extent(varphi)
+    elif req[0] == "and":
+        (lo1, hi1) = requirement_extent(varphi[0])
+        (lo2, hi2) = requirement_extent(varphi[1])
+        return min(lo1, lo2), max(hi1, hi2)
+    elif req[0] in ("always", "eventually"):
+        (lo, hi) = requirement_extent(varphi)
+        return req[1][0] + lo, req[1][1] + hi
+    elif req[0] == "until":
+        (lo1, hi1) = requirement_extent(varphi[0])
+        (lo2, hi2) = requirement_extent(varphi[1])
+        return req[1][0] + min(lo1, lo2), req[1][1] + max(hi1, hi2)
+    raise NotImplementedError("No extent for requirement {}".format(req[0]))
+
+
+def requirement_horizon(requirement):
+    return max(requirement_extent(requirement)[1], 0)
+
+
+"""Chunks (start, stop) of the output and the slices (first, last) of the trace they are computed on.
+Chunks default to 8 times the overlap (at least 65536 samples), so at most 1/8 of the work is done twice."""
+def chunks(n, before, after, chunksize=None):
+    if chunksize is None:
+        chunksize = max(1 << 16, 8 * (before + after))
+    for start in range(0, n, chunksize):
+        stop = min(start + chunksize, n)
+        yield start, stop, max(start - before, 0), min(stop + after, n)
+
+
+"""Quantitative robustness (as compile(stl)(trace)) of every sample of a (T,) or (T, k) array, chunk by chunk.
+out can be a preallocated (T,) array, e.g. np.lib.format.open_memmap, to keep the result on disk as well.
+executor is anything with a map method (concurrent.futures pools); chunks then run in parallel."""
+def score_chunked(stl, array, names=("x",), valuemap=None, chunksize=None, executor=None, out=None):
+    plan = stl if isinstance(stl, Plan) else compile(stl)
+    (lo, hi) = extent(plan.formula, valuemap)
+    before = int(np.ceil(max(-lo, 0)))
+    after = int(np.ceil(max(hi, 0)))
+    n = len(array)
+    if out is None:
+        out = np.empty(n)
+    parts = list(chunks(n, before, after, chunksize))
+    tasks = [(plan, array[first:last], names, valuemap, start - first, stop - first) for (start, stop, first, last) in parts]
+    results = (executor.map if executor is not None else map)(_scorechunk, *zip(*tasks)) if tasks else []
+    for ((start, stop, first, last), value) in zip(parts, results):
+        out[start:stop] = value
+    return out
+
+
+def _scorechunk(plan, block, names, valuemap, start, stop):
+    return plan(Trace.fromarray(np.asarray(block, dtype=float), names), valuemap)[start:stop]
+
+
+"""umonitor_signal of a requirement chunk by chunk: the omega of every mu is a (T, 2) array of (mean, sigma) rows,
+typically memory-mapped. Returns (T, 2) [lower, upper], NaN where the windows pass the end of the trace."""
+def umonitor_chunked(requirement, chunksize=None, executor=None, out=None):
+    (lo, hi) = requirement_extent(requirement)
+    before = max(-lo, 0)
+    after = max(hi, 0)
+    n = len(_omegas(requirement)[0])
+    if out is None:
+        out = np.empty((n, 2))
+    parts = list(chunks(n, before, after, chunksize))
+    tasks = [(map_requirement(requirement, lambda omega: omega[first:last]), start - first, stop - first) for (start, stop, first, last) in parts]
+    results = (executor.map if executor is not None else map)(_umonitorchunk, *zip(*tasks)) if tasks else []
+    for ((start, stop, first, last), value) in zip(parts, results):
+        out[start:stop] = value
+    return out
+
+
+def _umonitorchunk(requirement, start, stop):
+    return umonitor_signal(requirement)[start:stop]
+
+
+def _omegas(requirement):
+    omegas = []
+    map_requirement(requirement, lambda omega: omegas.append(omega))
+    return omegas
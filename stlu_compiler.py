@@ -0,0 +1,283 @@
+import numpy as np
+from collections import OrderedDict
+from stlu_grammar import *
+from stlu_trace import Trace
+from stlu_derived import termkey, hasparam, signal, arithtable
+from stlu_window import slidingmin, slidingmax, windowmin, windowmax, slidinguntil, untilwindow, offsetbounds, RangeIndex
+"""
+File summary
+In this file, we will lower a parsed formula once into a flat plan of vectorized array operations. Running the plan
+on a Trace gives the quantitativescore robustness of every time point at once, so the same plan can be reused over
+many traces without the singledispatch walk at every time point.
+Windows are cut at the end of the trace like gettime does, a time point whose window is empty gets NaN.
+An interval whose parameters put its left bound after its right bound is an empty interval: always gives +inf,
+eventually and the window part of until give -inf (min and max over nothing), so sweeps stay monotone.
+"""
+
+
+robusttable = { "<" : lambda x,y: y-x, "<=" : lambda x,y: y-x, ">" : lambda x,y: x-y , ">=": lambda x,y: x-y, "==" : lambda x,y: -abs(x-y) }
+
+
+"""A compiled formula: steps[i] = (opcode, args), args refer to earlier steps by index. The last step is the result."""
+class Plan(object):
+    def __init__(self, formula, steps, params):
+        self.formula = formula
+        self.steps = steps
+        self.params = params
+        # parameter names every step depends on, directly or through its children
+        self.depends = []
+        for (opcode, args) in steps:
+            names = set(name for (kind, name) in _steprefs(opcode, args) if kind == "param")
+            for (kind, i) in _steprefs(opcode, args):
+                if kind == "step":
+                    names |= self.depends[i]
+            self.depends.append(frozenset(names))
+
+    def __repr__(self):
+        return "Plan({}, {} steps)".format(self.formula, len(self.steps))
+
+    """Robustness of every time point. With a stlu_cache.DiskCache the result is looked up by content first."""
+    def __call__(self, trace, valuemap=None, cache=None):
+        if not isinstance(trace, Trace):
+            trace = Trace.fromarray(trace)
+        _sampled(trace)
+        valuemap = valuemap or {}
+        if cache is not None:
+            return cache.fetch(cache.key("plan", self.formula, trace, valuemap), lambda: self(trace, valuemap))
+        values = []
+        for (opcode, args) in self.steps:
+            values.append(_ops[opcode](trace, values, valuemap, *args))
+        return _signalof(trace, values[-1])
+
+    """Tie the plan to one trace for repeated evaluation under different parameter valuations"""
+    def bind(self, trace, cachesize=16):
+        return BoundPlan(self, trace, cachesize)
+
+
+"""A plan tied to one trace, the evaluation context of parameter synthesis. The signal of every step is cached
+under the values of the parameters that step depends on (Plan.depends), so a new valuation only recomputes the
+steps on the path from the changed parameters to the root; parameter-free steps are computed once.
+An always/eventually whose only parameters are its interval bounds is answered from a RangeIndex over its
+(fixed) child signal, so each new valuation costs O(T) for that step whatever the window.
+Each step keeps its last cachesize signals."""
+class BoundPlan(object):
+    def __init__(self, plan, trace, cachesize=16):
+        if not isinstance(trace, Trace):
+            trace = Trace.fromarray(trace)
+        _sampled(trace)
+        self.plan = plan
+        self.trace = trace
+        self.cachesize = cachesize
+        self.memo = [OrderedDict() for step in plan.steps]
+        self.keys = [sorted(names) for names in plan.depends]
+        self.indexes = {}
+
+    def __call__(self, valuemap=None):
+        valuemap = valuemap or {}
+        values = []
+        for (i, (opcode, args)) in enumerate(self.plan.steps):
+            key = tuple(float(valuemap[name]) if name in valuemap else None for name in self.keys[i])
+            memo = self.memo[i]
+            if key in memo:
+                memo.move_to_end(key)
+                values.append(memo[key])
+                continue
+            if opcode in ("globally", "eventually") and not self.plan.depends[args[2]]:
+                value = self.sweep(i, opcode, args, values, valuemap)
+            else:
+                value = _ops[opcode](self.trace, values, valuemap, *args)
+            memo[key] = value
+            if len(memo) > self.cachesize:
+                memo.popitem(last=False)
+            values.append(value)
+        return _signalof(self.trace, values[-1])
+
+    def sweep(self, i, opcode, args, values, valuemap):
+        (left, right) = _interval(args, valuemap, opcode)
+        if _isempty(self.trace, left, right):
+            return _empty(self.trace, "min" if opcode == "globally" else "max")
+        if i not in self.indexes:
+            self.indexes[i] = RangeIndex(_signalof(self.trace, values[args[2]]))
+        offsets = self.trace.offsets(left, right)
+        if offsets is not None:
+            (lo, hi) = offsetbounds(len(self.trace), offsets[0], offsets[1])
+        else:
+            (lo, hi) = self.trace.bounds(left, right)
+        if opcode == "globally":
+            return self.indexes[i].min(lo, hi)
+        return self.indexes[i].max(lo, hi)
+
+
+"""Lower a parsed formula into a Plan. Identical subformulas and terms are lowered to one step."""
+def compile(formula):
+    steps = []
+    table = {}
+    params = set()
+    _lower(formula, steps, table, params)
+    return Plan(formula, steps, sorted(params))
+
+
+def _lower(stl, steps, table, params):
+    if isinstance(stl, Formula):
+        return _lower(stl.subformula, steps, table, params)
+    elif isinstance(stl, (Globally, Eventually)):
+        step = (type(stl).__name__.lower(), (_bound(stl.interval.left, params), _bound(stl.interval.right, params), _lower(stl.subformula, steps, table, params)))
+    elif isinstance(stl, Until):
+        step = ("until", (_bound(stl.interval.left, params), _bound(stl.interval.right, params), _lower(stl.left, steps, table, params), _lower(stl.right, steps, table, params)))
+    elif isinstance(stl, (Or, And, Implies)):
+        step = (type(stl).__name__.lower(), (_lower(stl.left, steps, table, params), _lower(stl.right, steps, table, params)))
+    elif isinstance(stl, Not):
+        step = ("not", (_lower(stl.subformula, steps, table, params),))
+    elif isinstance(stl, Constraint):
+        step = ("constraint", (stl.relop, _lower(stl.term, steps, table, params), _lower(stl.bound, steps, table, params)))
+    elif isinstance(stl, Expr) and not hasparam(termkey(stl)):
+        # parameter-free terms come from the arrays shared on the trace
+        step = ("derived", (termkey(stl),))
+    elif isinstance(stl, Expr):
+        step = ("arith", (stl.arithop, _lower(stl.left, steps, table, params), _lower(stl.right, steps, table, params)))
+    elif isinstance(stl, Atom):
+        step = ("atom", (stl.name,))
+    elif isinstance(stl, Var):
+        try:
+            # numbers in a constraint parse as Var, the id rule also matches digits
+            step = ("const", (float(stl.name),))
+        except ValueError:
+            step = ("signal", (stl.name,))
+    elif isinstance(stl, Param):
+        params.add(stl.name)
+        step = ("param", (stl.name,))
+    elif isinstance(stl, Constant):
+        step = ("const", (float(stl),))
+    else:
+        raise NotImplementedError("No compile for {} of class {}".format(stl, stl.__class__))
+    if step not in table:
+        table[step] = len(steps)
+        steps.append(step)
+    return table[step]
+
+
+"""A plan computes every step at the samples only, the ends of windows between samples that an interpolated trace
+adds would need the children at other times"""
+def _sampled(trace):
+    if trace.interpolation is not None:
+        raise ValueError("Plans evaluate traces at their samples, use quantitativescore on a trace with {} interpolation".format(trace.interpolation))
+
+
+"""Interval bounds stay symbolic when they are parameters: ('param', name) or ('const', value)"""
+def _bound(b, params):
+    if isinstance(b, Param):
+        params.add(b.name)
+        return ("param", b.name)
+    return ("const", float(b))
+
+
+def _boundvalue(b, valuemap):
+    if b[0] == "param":
+        if b[1] not in valuemap:
+            raise KeyError("No value for parameter {}".format(b[1]))
+        return float(valuemap[b[1]])
+    return b[1]
+
+
+def _interval(args, valuemap, stl):
+    left = _boundvalue(args[0], valuemap)
+    right = _boundvalue(args[1], valuemap)
+    if left > right and args[0][0] == "const" and args[1][0] == "const":
+        raise ValueError("Interval [{},{}] empty for {}".format(left, right, stl))
+    return left, right
+
+
+"""Constant steps stay scalars until a temporal operator needs them as a signal"""
+def _signalof(trace, value):
+    if np.ndim(value) == 0:
+        return np.full(trace.shape, float(value))
+    return value
+
+
+"""An inverted interval, or on a regular trace one that contains no sample offset"""
+def _isempty(trace, left, right):
+    if left > right:
+        return True
+    offsets = trace.offsets(left, right)
+    return offsets is not None and offsets[0] > offsets[1]
+
+
+def _empty(trace, kind):
+    return np.full(trace.shape, np.inf if kind == "min" else -np.inf)
+
+
+def _rolling(trace, x, left, right, kind):
+    x = _signalof(trace, x)
+    if _isempty(trace, left, right):
+        return _empty(trace, kind)
+    offsets = trace.offsets(left, right)
+    if offsets is not None:
+        return (slidingmin if kind == "min" else slidingmax)(x, offsets[0], offsets[1])
+    (lo, hi) = trace.bounds(left, right)
+    return (windowmin if kind == "min" else windowmax)(x, lo, hi)
+
+
+def _globally(trace, values, valuemap, left, right, i):
+    (left, right) = _interval((left, right), valuemap, "G")
+    return _rolling(trace, values[i], left, right, "min")
+
+
+def _eventually(trace, values, valuemap, left, right, i):
+    (left, right) = _interval((left, right), valuemap, "E")
+    return _rolling(trace, values[i], left, right, "max")
+
+
+def _until(trace, values, valuemap, left, right, i, j):
+    (left, right) = _interval((left, right), valuemap, "U")
+    l = _signalof(trace, values[i])
+    r = _signalof(trace, values[j])
+    if _isempty(trace, left, right):
+        return r
+    offsets = trace.offsets(left, right)
+    if offsets is not None:
+        window = slidinguntil(l, r, offsets[0], offsets[1])
+    else:
+        (lo, hi) = trace.bounds(left, right)
+        window = untilwindow(l, r, lo, hi)
+    return np.maximum(r, window)
+
+
+"""What the arguments of a step refer to: ('step', index) for children, ('param', name) for parameters"""
+def _steprefs(opcode, args):
+    if opcode in ("globally", "eventually", "until"):
+        return [b for b in args[:2] if b[0] == "param"] + [("step", i) for i in args[2:]]
+    elif opcode in ("or", "and", "implies", "not"):
+        return [("step", i) for i in args]
+    elif opcode in ("constraint", "arith"):
+        return [("step", i) for i in args[1:]]
+    elif opcode == "param":
+        return [("param", args[0])]
+    return []
+
+
+def _param(trace, values, valuemap, name):
+    if name not in valuemap:
+        raise KeyError("No value for parameter {}".format(name))
+    return float(valuemap[name])
+
+
+def _atom(trace, values, valuemap, name):
+    return (np.asarray(trace[name]) != 0).astype(float)
+
+
+_ops = {
+    "globally": _globally,
+    "eventually": _eventually,
+    "until": _until,
+    "or": lambda trace, values, valuemap, i, j: np.maximum(values[i], values[j]),
+    "and": lambda trace, values, valuemap, i, j: np.minimum(values[i], values[j]),
+    "implies": lambda trace, values, valuemap, i, j: np.maximum(-1 * values[i], values[j]),
+    "not": lambda trace, values, valuemap, i: -1 * values[i],
+    "constraint": lambda trace, values, valuemap, relop, i, j: robusttable[relop](values[i], values[j]),
+    "derived": lambda trace, values, valuemap, key: signal(key, trace),
+    "arith": lambda trace, values, valuemap, arithop, i, j: arithtable[arithop](values[i], values[j]),
+    "atom": _atom,
+    "signal": lambda trace, values, valuemap, name: np.asarray(trace[name], dtype=float),
+    "param": _param,
+    "const": lambda trace, values, valuemap, value: value,
+}
@@ -0,0 +1,59 @@
+import numpy as np
+import operator as op
+from stlu_grammar import *
+"""
+File summary
+In this file, we will compute the arithmetic terms of constraints ({x - y}, {x * 2}, ...) once per trace as whole
+arrays. A term is keyed by its structure (node types included, Var('3') and Constant(3) are different keys) and its
+array is kept in trace.derived, so every constraint and every formula that mentions the same term on the same trace,
+in the scorers or in compiled plans, reads the same array. Terms with parameters are not cached, their value
+depends on the valuation. trace.derived.clear() frees the arrays.
+"""
+
+arithtable = { "+" : op.add, "-" : op.sub, "*" : op.mul, "/" : op.truediv }
+
+
+"""Structural key of a term: nested tuples ('Expr', arithop, left, right), ('Var', name), ('Constant', value)"""
+def termkey(term):
+    if isinstance(term, Expr):
+        return ("Expr", term.arithop, termkey(term.left), termkey(term.right))
+    elif isinstance(term, Var):
+        return ("Var", term.name)
+    elif isinstance(term, Param):
+        return ("Param", term.name)
+    elif isinstance(term, Constant):
+        return ("Constant", float(term))
+    raise NotImplementedError("No derived signal for {} of class {}".format(term, term.__class__))
+
+
+def hasparam(key):
+    if key[0] == "Expr":
+        return hasparam(key[2]) or hasparam(key[3])
+    return key[0] == "Param"
+
+
+"""Float array of a term over all samples of trace (a number if the term is constant), computed once per trace"""
+def derived(term, trace):
+    return signal(termkey(term), trace)
+
+
+"""Array of a term given by its key, see derived"""
+def signal(key, trace):
+    if key in trace.derived:
+        return trace.derived[key]
+    if key[0] == "Var":
+        if key[1] not in trace:
+            # numbers in a constraint parse as Var, the id rule also matches digits
+            try:
+                return float(key[1])
+            except ValueError:
+                raise KeyError("No signal {} in trace".format(key[1]))
+        return np.asarray(trace[key[1]], dtype=float)
+    elif key[0] == "Constant":
+        return key[1]
+    elif key[0] == "Param":
+        raise NotImplementedError("No derived signal for parameter {}".format(key[1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = arithtable[key[1]](signal(key[2], trace), signal(key[3], trace))
+    trace.derived[key] = value
+    return value
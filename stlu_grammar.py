@@ -1,8 +1,10 @@
 from parsimonious import Grammar, NodeVisitor
 from collections.abc import Mapping
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from functools import lru_cache
 import random
 import math
+import re
 """
 File summary
 In this file, we will define the grammar of STLU inputs regardless of the strong or weak.
@@ -22,7 +24,7 @@ implies = "(" _ sub_formula _ "->" _ sub_formula _ ")"
 npred = "!" _ sub_formula 
 pred = constraint / atom 
 constraint =  term _ relop _ term
-term = infix / var
+term = infix / param / var
 infix = "{" _ term _ arithop _ term _ "}"
 var = _ id _
 atom = _ id _
@@ -211,46 +213,427 @@ class Constant(float):
 def parse(tlStr):
     return TLVisitor().visit(_grammar["Formula"].parse(tlStr))
     #return _grammar["formula"].parse(tlStr)
-    
-    
-def interval_generator():
-    interval_num1 = random.randint(0,20)
-    interval_num2 = random.randint(interval_num1 + 1, interval_num1 + 50)
+
+
+class FormulaSyntaxError(ValueError):
+    pass
+
+
+_ws = re.compile(r"\s*")
+_id = re.compile(r"[a-zA-z\d]+")
+_num = re.compile(r"[\+\-]?\d*(\.\d+)?")
+_relops = (">=", "<=", "<", ">", "==")
+_arithops = ("+", "-", "*", "/")
+
+
+"""A num the grammar accepts but float() does not (e.g. the empty num of 'G[,5]'). parse only fails on it once it
+ends up in the final tree, so it is kept as a marker until then."""
+class _BadNum(str):
+    pass
+
+
+"""Recursive-descent transliteration of grammar_text. Every rule is a method taking a position and returning
+(node, end) or None, ordered choices return their first match like the PEG does. The grammar is scannerless (id also
+matches digits and brackets, _ sits inside the rules), so the tokens are the same regexes matched in place.
+sub_formula is memoized per position: or/and/implies/paren_formula all start by parsing the same one."""
+class _Parser(object):
+    def __init__(self, text):
+        self.text = text
+        self.memo = {}
+        self.bad = False
+
+    def ws(self, i):
+        return _ws.match(self.text, i).end()
+
+    def lit(self, s, i):
+        return i + len(s) if self.text.startswith(s, i) else -1
+
+    def formula(self):
+        text = self.text
+        i = self.ws(0)
+        if i >= len(text) or text[i] not in "ws":
+            raise FormulaSyntaxError("Expected flag w or s at {} in {!r}".format(i, text))
+        flag = text[i]
+        i = self.ws(self.ws(i + 1))
+        if self.lit(",", i) < 0:
+            raise FormulaSyntaxError("Expected ',' at {} in {!r}".format(i, text))
+        res = self.sub_formula(self.ws(i + 1))
+        if res is None:
+            raise FormulaSyntaxError("No formula at {} in {!r}".format(i + 1, text))
+        (node, i) = res
+        i = self.ws(i)
+        if i != len(text):
+            raise FormulaSyntaxError("Unexpected {!r} at {} in {!r}".format(text[i:i + 10], i, text))
+        node = Formula(flag, node)
+        if self.bad and _hasbadnum(node):
+            raise FormulaSyntaxError("Invalid number in {!r}".format(text))
+        return node
+
+    def sub_formula(self, i):
+        if i in self.memo:
+            return self.memo[i]
+        j = self.ws(i)
+        res = None
+        for rule in (self.globally, self.eventually, self.until, self.expr, self.paren_formula):
+            res = rule(j)
+            if res is not None:
+                res = (res[0], self.ws(res[1]))
+                break
+        self.memo[i] = res
+        return res
+
+    def paren_formula(self, i):
+        i = self.lit("(", i)
+        if i < 0:
+            return None
+        res = self.sub_formula(self.ws(i))
+        if res is None:
+            return None
+        i = self.lit(")", self.ws(res[1]))
+        return None if i < 0 else (res[0], i)
+
+    def temporal(self, i, op, cls):
+        i = self.lit(op, i)
+        if i < 0:
+            return None
+        interval = self.interval(i)
+        if interval is None:
+            return None
+        res = self.sub_formula(interval[1])
+        if res is None:
+            return None
+        return cls(interval[0], res[0]), res[1]
+
+    def globally(self, i):
+        return self.temporal(i, "G", Globally)
+
+    def eventually(self, i):
+        return self.temporal(i, "E", Eventually)
+
+    def until(self, i):
+        i = self.lit("U", i)
+        if i < 0:
+            return None
+        interval = self.interval(i)
+        if interval is None:
+            return None
+        i = self.lit("(", interval[1])
+        if i < 0:
+            return None
+        left = self.sub_formula(i)
+        if left is None:
+            return None
+        i = self.lit(",", left[1])
+        if i < 0:
+            return None
+        right = self.sub_formula(i)
+        if right is None:
+            return None
+        i = self.lit(")", right[1])
+        return None if i < 0 else (Until(interval[0], left[0], right[0]), i)
+
+    def interval(self, i):
+        i = self.lit("[", self.ws(i))
+        if i < 0:
+            return None
+        left = self.bound(self.ws(i))
+        if left is None:
+            return None
+        i = self.lit(",", self.ws(left[1]))
+        if i < 0:
+            return None
+        right = self.bound(self.ws(i))
+        if right is None:
+            return None
+        i = self.lit("]", self.ws(right[1]))
+        return None if i < 0 else (Interval(left[0], right[0]), self.ws(i))
+
+    def expr(self, i):
+        for (op, cls) in (("|", Or), ("&", And), ("->", Implies)):
+            res = self.binary(i, op, cls)
+            if res is not None:
+                return res
+        return self.npred(i) or self.constraint(i) or self.atom(i)
+
+    def binary(self, i, op, cls):
+        i = self.lit("(", i)
+        if i < 0:
+            return None
+        left = self.sub_formula(self.ws(i))
+        if left is None:
+            return None
+        i = self.lit(op, self.ws(left[1]))
+        if i < 0:
+            return None
+        right = self.sub_formula(self.ws(i))
+        if right is None:
+            return None
+        i = self.lit(")", self.ws(right[1]))
+        return None if i < 0 else (cls(left[0], right[0]), i)
+
+    def npred(self, i):
+        i = self.lit("!", i)
+        if i < 0:
+            return None
+        res = self.sub_formula(self.ws(i))
+        return None if res is None else (Not(res[0]), res[1])
+
+    def constraint(self, i):
+        left = self.term(i)
+        if left is None:
+            return None
+        i = self.ws(left[1])
+        for relop in _relops:
+            if self.text.startswith(relop, i):
+                break
+        else:
+            return None
+        right = self.term(self.ws(i + len(relop)))
+        return None if right is None else (Constraint(relop, left[0], right[0]), right[1])
+
+    def term(self, i):
+        return self.infix(i) or self.param(i) or self.var(i)
+
+    def infix(self, i):
+        i = self.lit("{", i)
+        if i < 0:
+            return None
+        left = self.term(self.ws(i))
+        if left is None:
+            return None
+        i = self.ws(left[1])
+        for arithop in _arithops:
+            if self.text.startswith(arithop, i):
+                break
+        else:
+            return None
+        right = self.term(self.ws(i + len(arithop)))
+        if right is None:
+            return None
+        i = self.lit("}", self.ws(right[1]))
+        return None if i < 0 else (Expr(arithop, left[0], right[0]), i)
+
+    def name(self, i):
+        m = _id.match(self.text, self.ws(i))
+        return None if m is None else (m.group(), self.ws(m.end()))
+
+    def var(self, i):
+        res = self.name(i)
+        return None if res is None else (Var(res[0]), res[1])
+
+    def atom(self, i):
+        res = self.name(i)
+        return None if res is None else (Atom(res[0]), res[1])
+
+    def bound(self, i):
+        return self.param(i) or self.num(i)
+
+    def param(self, i):
+        m = _id.match(self.text, i)
+        if m is None:
+            return None
+        i = self.lit("?", m.end())
+        if i < 0:
+            return None
+        (left, i) = self.num(self.ws(i))
+        i = self.lit(";", i)
+        if i < 0:
+            return None
+        (right, i) = self.num(i)
+        return Param(m.group(), left, right), self.ws(i)
+
+    def num(self, i):
+        m = _num.match(self.text, i)
+        try:
+            return Constant(m.group()), m.end()
+        except ValueError:
+            self.bad = True
+            return _BadNum(m.group()), m.end()
+
+
+def _hasbadnum(node):
+    if isinstance(node, _BadNum):
+        return True
+    return isinstance(node, tuple) and any(_hasbadnum(child) for child in node)
+
+
+"""Same result as parse without parsimonious: one pass of regex matches, no parse tree and no visitor.
+Raises FormulaSyntaxError where parse raises a parsimonious error."""
+def parse_fast(tlStr):
+    return _Parser(tlStr).formula()
+
+
+"""Parse a corpus of formula strings, repeated strings are parsed once and the nodes are interned"""
+def parse_many(tlStrs):
+    parsed = {}
+    out = []
+    for tlStr in tlStrs:
+        if tlStr not in parsed:
+            parsed[tlStr] = parse_cached(tlStr)
+        out.append(parsed[tlStr])
+    return out
+
+
+"""Parity check of parse_fast against parse: the formulas on which the two disagree, as (formula, parse result,
+parse_fast result). A parse error on both sides counts as agreement. Namedtuples compare equal across node types,
+so the node types are compared as well."""
+def parse_parity(tlStrs):
+    mismatches = []
+    for tlStr in tlStrs:
+        try:
+            expected = parse(tlStr)
+        except Exception as e:
+            expected = e
+        try:
+            actual = parse_fast(tlStr)
+        except FormulaSyntaxError as e:
+            actual = e
+        if isinstance(expected, Exception) and isinstance(actual, Exception):
+            continue
+        if isinstance(expected, Exception) or isinstance(actual, Exception) or not _sametree(expected, actual):
+            mismatches.append((tlStr, expected, actual))
+    return mismatches
+
+
+def _sametree(a, b):
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all(_sametree(u, v) for (u, v) in zip(a, b))
+    return a == b or (a != a and b != b)
+
+
+# LRU of canonical nodes: node tuples cannot be weakly referenced, so the table is bounded instead. An entry keeps
+# its canonical children alive, so the child ids in its key cannot be reused while it is in the table.
+_interned = OrderedDict()
+_internsize = 1 << 16
+
+
+"""Hash-consing: the canonical shared copy of a node. Children are interned first, so a node is keyed by its type and
+the ids of its canonical children; the type is part of the key because namedtuples compare equal across node types
+(Var('x') == Atom('x')). Leaves (names, Constant) are keyed by type and repr, so 0.0 and -0.0 stay apart.
+Structurally identical formulas then share every node and per-node results can be cached by id. The table holds
+the _internsize most recently used nodes; a formula interned again after its nodes were evicted gets new ones."""
+def intern(node):
+    if isinstance(node, tuple):
+        children = [intern(child) for child in node]
+        key = (type(node),) + tuple(id(child) for child in children)
+        if key not in _interned:
+            same = all(child is old for (child, old) in zip(children, node))
+            _interned[key] = node if same else type(node)(*children)
+    else:
+        key = (type(node), repr(node))
+        if key not in _interned:
+            _interned[key] = node
+    _interned.move_to_end(key)
+    canonical = _interned[key]
+    while len(_interned) > _internsize:
+        _interned.popitem(last=False)
+    return canonical
+
+
+"""Whitespace only separates tokens in the grammar, so runs of it collapse to one space"""
+def normalize_formula(tlStr):
+    return re.sub(r"\s+", " ", tlStr).strip()
+
+
+@lru_cache(maxsize=4096)
+def _parse_normalized(tlStr):
+    return intern(parse_fast(tlStr))
+
+
+"""parse_fast behind an LRU cache keyed by the normalized string, the result is interned and shared between callers"""
+def parse_cached(tlStr):
+    return _parse_normalized(normalize_formula(tlStr))
+
+
+"""Drop the interned nodes and the parse cache"""
+def clear_interned():
+    _interned.clear()
+    _parse_normalized.cache_clear()
+
+
+def interval_generator(rng=random):
+    interval_num1 = rng.randint(0,20)
+    interval_num2 = rng.randint(interval_num1 + 1, interval_num1 + 50)
     interval = " [ " + str(interval_num1) + " , " + str(interval_num2)+ " ] "
     return interval
   
 
-def stl_generator1(flag_num):
+"""One formula of the fixed shape flag, op [interval] (A & c relop n) (op from E, G, U). rng is a random.Random
+for reproducible output, the global random state by default."""
+def stl_generator1(flag_num, rng=random):
     if flag_num not in [0,1]:
-        print("flag need to chosen from 0 and 1 where 0 is strong and 1 is weak")
+        raise ValueError("flag need to chosen from 0 and 1 where 0 is strong and 1 is weak")
     rule1_lst = ["E", "G", "U"]
     rule2_lst = ["&", "|"]
     relop_lst = [">=" , "<=" , "<" , ">" , "=="]
     flag_lst = ["s", "w"]
     flag = flag_lst[flag_num]
     negate_lst = ["", "! "]
-    rand_rule1 = random.randint(0,2)
-    rand_rule2 = random.randint(0,1)
-    rand_relop = random.randint(0,4)
+    rand_rule1 = rng.randint(0,2)
+    rand_rule2 = rng.randint(0,1)
+    rand_relop = rng.randint(0,4)
     rule1 = rule1_lst[rand_rule1]
     rule2 = rule2_lst[rand_rule2]
     relop = relop_lst[rand_relop]
-    negate = negate_lst[random.randint(0,1)]
-    interval = interval_generator()
+    negate = negate_lst[rng.randint(0,1)]
+    interval = interval_generator(rng)
 
     if rand_rule1 == 2:
-      formula1 = "( A " + rule2 +" " + negate + "c " + str(relop_lst[random.randint(0,4)]) + " "+ str(random.randint(0,1000))+ " )"
-      formula2 = "b "+ relop + " " + str(random.randint(0,1000))
+      formula1 = "( A " + rule2 +" " + negate + "c " + str(relop_lst[rng.randint(0,4)]) + " "+ str(rng.randint(0,1000))+ " )"
+      formula2 = "b "+ relop + " " + str(rng.randint(0,1000))
       output_str = flag + " , " + rule1 + interval + "("+ formula1 + "," + formula2 + ")"
       return output_str
     else:
-      formula1 = "( A " + rule2 +" " + negate + "c " + str(relop_lst[random.randint(0,4)]) + " "+ str(random.randint(0,1000))+ " )"
+      formula1 = "( A " + rule2 +" " + negate + "c " + str(relop_lst[rng.randint(0,4)]) + " "+ str(rng.randint(0,1000))+ " )"
       output_str = flag +  " , " + rule1 + interval + formula1
       return output_str
-      
-res = stl_generator1(1)
-print(res)      
-print(parse(res))
+
+
+"""Operator mix of stl_generator: relative weight of every operator at the inner levels"""
+default_ops = { "G" : 1, "E" : 1, "U" : 1, "&" : 1, "|" : 1, "->" : 1, "!" : 1 }
+
+
+"""Reproducible random formula string: the same arguments and seed always give the same formula.
+depth: number of operator levels above the constraints (every path from the root has exactly this many).
+ops: operator -> weight, see default_ops. width: (min, max) width of temporal intervals in samples, start: (min, max)
+of their left bound. signals: the constraints compare x0 .. x{signals-1} (just x for one signal) with integers in
+values, with one of relops. flag: "s", "w" or None to draw it."""
+def stl_generator(depth=2, seed=None, ops=None, width=(1, 50), start=(0, 20), signals=1, values=(0, 1000), flag=None,
+                  relops=(">=", "<=", "<", ">", "==")):
+    rng = random.Random(seed)
+    ops = default_ops if ops is None else ops
+    names = ["x"] if signals == 1 else ["x" + str(i) for i in range(signals)]
+    relops = list(relops)
+    kinds = [op for op in sorted(ops) if ops[op] > 0]
+    weights = [ops[op] for op in kinds]
+
+    def interval():
+        left = rng.randint(start[0], start[1])
+        return "[{},{}]".format(left, left + rng.randint(width[0], width[1]))
+
+    def formula(level):
+        if level == 0:
+            return "({} {} {})".format(rng.choice(names), rng.choice(relops), rng.randint(values[0], values[1]))
+        op = rng.choices(kinds, weights)[0]
+        if op in ("G", "E"):
+            return "{}{} {}".format(op, interval(), formula(level - 1))
+        elif op == "U":
+            return "U{}({}, {})".format(interval(), formula(level - 1), formula(level - 1))
+        elif op == "!":
+            return "! {}".format(formula(level - 1))
+        return "({} {} {})".format(formula(level - 1), op, formula(level - 1))
+
+    flag = rng.choice(["s", "w"]) if flag is None else flag
+    return "{}, {}".format(flag, formula(depth))
+
+
+"""A list of n reproducible formulas, the i-th one drawn with seed (seed, i)"""
+def stl_corpus(n, seed=0, **kwargs):
+    return [stl_generator(seed="{}-{}".format(seed, i), **kwargs) for i in range(n)]
+
+
 # Until's interval need to be configured 
 #result = parse('a<b')
 # result2 = parse("µ 0.95 1 -1 w")
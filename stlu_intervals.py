@@ -0,0 +1,175 @@
+import numpy as np
+from stlu_grammar import *
+from stlu_trace import Trace
+from stlu_scorer import optable
+from stlu_derived import derived
+"""
+File summary
+In this file, we will decide Boolean satisfaction of a formula over a whole trace at once, as an interval set: a
+sorted (k, 2) array of disjoint [start, end) sample index ranges where the formula holds. Constraints and atoms are
+turned into interval sets from their sample values, then every operator works on the intervals only: connectives are
+set algebra, eventually is a dilation of the set by the window and always its dual erosion (Maler-Nickovic), until
+is the part of the dilation of l & r whose window starts inside the same run of l. Past the leaves the cost grows
+with the number of signal changes, not with the number of samples.
+The semantics are the ones of qualitativescore: windows are cut at the end of the trace, always over an empty
+window holds, eventually over an empty window does not and until falls back to r(t). Dense sets can be stored as
+packed bitsets with tobits / frombits.
+"""
+
+
+"""Interval set of the time points where stl holds, on a Trace (single trace, not a batch) or a dict trace"""
+def satisfaction(stl, x):
+    trace = x if isinstance(x, Trace) else Trace.fromdict(x)
+    if len(trace.shape) > 1:
+        raise ValueError("satisfaction works on a single trace, got signals of shape {}".format(trace.shape))
+    if trace.interpolation is not None:
+        raise ValueError("satisfaction works on the samples of a trace, got {} interpolation".format(trace.interpolation))
+    return _satisfaction(stl, trace, len(trace))
+
+
+"""Closed time intervals [time[start], time[end - 1]] of an interval set on trace"""
+def times(sat, trace):
+    return [(trace.time[start].item(), trace.time[end - 1].item()) for (start, end) in sat]
+
+
+"""Interval set of a boolean mask"""
+def frommask(mask):
+    d = np.diff(np.concatenate([[0], np.asarray(mask, dtype=np.int8), [0]]))
+    return np.stack([np.flatnonzero(d == 1), np.flatnonzero(d == -1)], axis=1)
+
+
+"""Boolean mask of n samples of an interval set"""
+def tomask(sat, n):
+    marks = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(marks, sat[:, 0], 1)
+    np.add.at(marks, sat[:, 1], -1)
+    return np.cumsum(marks[:n]) > 0
+
+
+"""Packed bitset (np.packbits, 1 bit per sample) of an interval set"""
+def tobits(sat, n):
+    return np.packbits(tomask(sat, n))
+
+
+def frombits(bits, n):
+    return frommask(np.unpackbits(bits, count=n).astype(bool))
+
+
+def union(a, b):
+    return _normalize(np.concatenate([a[:, 0], b[:, 0]]), np.concatenate([a[:, 1], b[:, 1]]))
+
+
+"""Samples of [0, n) outside the interval set"""
+def complement(a, n):
+    return _normalize(np.concatenate([[0], a[:, 1]]), np.concatenate([a[:, 0], [n]]))
+
+
+def intersection(a, b, n):
+    return complement(union(complement(a, n), complement(b, n)), n)
+
+
+def _satisfaction(stl, trace, n):
+    if isinstance(stl, Formula):
+        return _satisfaction(stl.subformula, trace, n)
+    elif isinstance(stl, (Globally, Eventually, Until)):
+        (left, right) = (float(stl.interval.left), float(stl.interval.right))
+        if left > right:
+            raise ValueError("Interval [{},{}] empty for {}".format(left, right, stl))
+        if isinstance(stl, Globally):
+            return complement(_dilate(trace, complement(_satisfaction(stl.subformula, trace, n), n), left, right), n)
+        elif isinstance(stl, Eventually):
+            return _dilate(trace, _satisfaction(stl.subformula, trace, n), left, right)
+        return _until(trace, _satisfaction(stl.left, trace, n), _satisfaction(stl.right, trace, n), left, right, n)
+    elif isinstance(stl, Or):
+        return union(_satisfaction(stl.left, trace, n), _satisfaction(stl.right, trace, n))
+    elif isinstance(stl, And):
+        return intersection(_satisfaction(stl.left, trace, n), _satisfaction(stl.right, trace, n), n)
+    elif isinstance(stl, Implies):
+        return union(complement(_satisfaction(stl.left, trace, n), n), _satisfaction(stl.right, trace, n))
+    elif isinstance(stl, Not):
+        return complement(_satisfaction(stl.subformula, trace, n), n)
+    elif isinstance(stl, Constraint):
+        with np.errstate(invalid='ignore'):
+            holds = optable[stl.relop](_term(stl.term, trace), _term(stl.bound, trace))
+        return frommask(np.broadcast_to(holds, (n,)))
+    elif isinstance(stl, Atom):
+        return frommask(np.asarray(trace[stl.name]) != 0)
+    raise NotImplementedError("No satisfaction for {} of class {}".format(stl, stl.__class__))
+
+
+def _term(term, trace):
+    if isinstance(term, (Expr, Var)):
+        return derived(term, trace)
+    elif isinstance(term, Constant):
+        return float(term)
+    raise NotImplementedError("No satisfaction for term {} of class {}".format(term, term.__class__))
+
+
+"""Sorted, merged interval set of the ranges [starts[i], ends[i]), empty ranges dropped"""
+def _normalize(starts, ends):
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    keep = starts < ends
+    (starts, ends) = (starts[keep], ends[keep])
+    if len(starts) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    order = np.argsort(starts, kind='stable')
+    (starts, ends) = (starts[order], ends[order])
+    reach = np.maximum.accumulate(ends)
+    # a range starting after everything before it has ended opens a new interval (adjacent ranges merge)
+    new = np.concatenate([[True], starts[1:] > reach[:-1]])
+    last = np.concatenate([np.flatnonzero(new)[1:] - 1, [len(starts) - 1]])
+    return np.stack([starts[new], reach[last]], axis=1)
+
+
+"""Time points whose window [t+left, t+right] holds a sample of each range of sat, one range per range of sat
+(not merged). On a regular trace the window of t is the offsets t+a .. t+b, cut at the end of the trace, so a range
+[s, e) is reached from [s-b, e-a). Otherwise the window bounds lo(t), hi(t) are monotone and the range is reached
+while lo(t) < e and hi(t) > s, except at time points whose window holds no sample at all."""
+def _reach(trace, sat, left, right, n):
+    offsets = trace.offsets(left, right)
+    if offsets is not None:
+        (a, b) = offsets
+        if a > b:
+            return np.zeros(len(sat), dtype=np.int64), np.zeros(len(sat), dtype=np.int64)
+        return np.clip(sat[:, 0] - b, 0, n), np.clip(sat[:, 1] - a, 0, n)
+    (lo, hi) = trace.bounds(left, right)
+    return np.searchsorted(hi, sat[:, 0], side='right'), np.searchsorted(lo, sat[:, 1], side='left')
+
+
+"""Time points whose window is empty (only on irregular traces or with a window narrower than one step)"""
+def _blind(trace, left, right, n):
+    offsets = trace.offsets(left, right)
+    if offsets is not None:
+        return frommask(np.ones(n, dtype=bool)) if offsets[0] > offsets[1] else np.empty((0, 2), dtype=np.int64)
+    (lo, hi) = trace.bounds(left, right)
+    return frommask(lo >= hi)
+
+
+"""First time point whose window starts at or after sample s, for every s"""
+def _startsafter(trace, s, left, right, n):
+    offsets = trace.offsets(left, right)
+    if offsets is not None:
+        return np.where(s == 0, 0, np.clip(s - offsets[0], 0, n))
+    (lo, hi) = trace.bounds(left, right)
+    return np.searchsorted(lo, s, side='left')
+
+
+"""Eventually: the time points whose window meets sat"""
+def _dilate(trace, sat, left, right):
+    n = len(trace)
+    reached = _normalize(*_reach(trace, sat, left, right, n))
+    return intersection(reached, complement(_blind(trace, left, right, n), n), n)
+
+
+"""Until: r(t), or some j of the window with r(j) and l from the start of the window up to j. Such a j lies in a
+range of l & r, the start of the window must then lie in the run of l that holds the range."""
+def _until(trace, l, r, left, right, n):
+    both = intersection(l, r, n)
+    if len(both) == 0:
+        return r
+    run = l[np.searchsorted(l[:, 0], both[:, 0], side='right') - 1, 0]
+    (starts, ends) = _reach(trace, both, left, right, n)
+    starts = np.maximum(starts, _startsafter(trace, run, left, right, n))
+    window = intersection(_normalize(starts, ends), complement(_blind(trace, left, right, n), n), n)
+    return union(r, window)
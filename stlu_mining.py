@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from stlu_trace import Trace
+from stlu_synth import synthSTLParam
+"""
+File summary
+In this file, we will mine every template on every trace of every client with a process pool. The traces of each
+client are copied once into shared memory, one client at a time, and the workers read them through views, so a task
+only carries its (client, trace) key and the templates to mine on that trace. Every result is appended to a
+JSON-lines results table as soon as its trace is done; a run that is restarted on the same table skips the keys
+already in it, so a crash only loses the traces in flight.
+"""
+
+
+"""Mine templates (name -> template string, e.g. STL_templates) on data (client -> array of traces, (N, T) for one
+signal or (N, T, k) for the k signals in names). Returns a summary with the counts and the per-template timing.
+workers=0 runs in this process, which is easier to debug."""
+def mineDataset(data, templates, resultsPath, names=("x",), workers=None, optmethod="analytic", retryErrors=False):
+    start = time.time()
+    done = set(key for (key, record) in loadResults(resultsPath).items() if not retryErrors or "error" not in record)
+    clients = list(data.keys())
+    # one task per trace with the templates still to mine on it, the templates share the Trace and its derived terms
+    tasks = []
+    for (c, client) in enumerate(clients):
+        for i in range(len(data[client])):
+            jobs = [(name, template) for (name, template) in templates.items() if (str(client), i, name) not in done]
+            if jobs:
+                tasks.append((c, i, jobs, names, optmethod))
+    records = []
+    _repairTail(resultsPath)
+    with open(resultsPath, "a") as out:
+        def write(record):
+            record["client"] = clients[record["client"]]
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+            records.append(record)
+
+        if workers == 0:
+            _views.update((c, np.asarray(data[client], dtype=float)) for (c, client) in enumerate(clients))
+            try:
+                for task in tasks:
+                    for record in _mineTrace(*task):
+                        write(record)
+            finally:
+                _views.clear()
+                _traces.clear()
+        elif tasks:
+            blocks = []
+            layout = []
+            try:
+                # one client at a time straight into its block, the parent never holds a second copy of the dataset
+                for client in clients:
+                    shape = np.shape(data[client])
+                    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+                    blocks.append(shm)
+                    np.ndarray(shape, np.float64, buffer=shm.buf)[...] = data[client]
+                    layout.append((shm.name, shape, np.dtype(np.float64).str))
+                with ProcessPoolExecutor(workers, initializer=_attach, initargs=(layout,)) as pool:
+                    futures = [pool.submit(_mineTrace, *task) for task in tasks]
+                    for future in as_completed(futures):
+                        for record in future.result():
+                            write(record)
+            finally:
+                for shm in blocks:
+                    shm.close()
+                    shm.unlink()
+    summary = timingReport(records)
+    summary.update(mined=len(records), skipped=len(done), failed=sum("error" in r for r in records), wall=time.time() - start)
+    return summary
+
+
+"""Results already in the table, keyed by (client, trace, template). Client keys are compared as strings, as they
+come back from JSON. A line cut short by a crash is ignored."""
+def loadResults(resultsPath):
+    results = {}
+    if not os.path.exists(resultsPath):
+        return results
+    with open(resultsPath) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            results[(str(record["client"]), record["trace"], record["template"])] = record
+    return results
+
+
+"""Per-template timing of mining results: count, total, mean and max of the synthesis time and of the task time"""
+def timingReport(records):
+    timing = {}
+    for record in records:
+        timing.setdefault(record["template"], []).append((record.get("dur", 0.0), record["elapsed"]))
+    report = {}
+    for (name, times) in timing.items():
+        (dur, elapsed) = np.array(times).T
+        report[name] = dict(count=len(times), total=float(elapsed.sum()), mean=float(elapsed.mean()), max=float(elapsed.max()),
+                            synth_mean=float(dur.mean()), synth_max=float(dur.max()))
+    return {"timing": report}
+
+
+# a crash can leave a half-written last line, the next record must start on a line of its own
+def _repairTail(resultsPath):
+    if not os.path.exists(resultsPath) or os.path.getsize(resultsPath) == 0:
+        return
+    with open(resultsPath, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+# worker state: client index -> array of traces (a view on shared memory in pool workers)
+_views = {}
+_blocks = []
+# the Trace being mined: the templates of one task share its derived term arrays
+_traces = {}
+
+
+def _attach(layout):
+    for (c, (name, shape, dtype)) in enumerate(layout):
+        shm = shared_memory.SharedMemory(name=name)
+        _blocks.append(shm)
+        _views[c] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+
+
+def _traceOf(c, i, names):
+    key = (c, i, tuple(names))
+    if key not in _traces:
+        _traces.clear()
+        _traces[key] = Trace.fromarray(_views[c][i], names)
+    return _traces[key]
+
+
+"""Mine the templates (name, template) of jobs on trace i of client c, one record per template"""
+def _mineTrace(c, i, jobs, names, optmethod):
+    return [_mineTask(c, i, name, template, names, optmethod) for (name, template) in jobs]
+
+
+def _mineTask(c, i, name, template, names, optmethod):
+    start = time.time()
+    record = {"client": c, "trace": i, "template": name}
+    try:
+        (stlsyn, value, dur) = synthSTLParam(template, _traceOf(c, i, names), optmethod)
+        record.update(formula=repr(stlsyn), value=value, dur=dur)
+    except Exception as e:
+        record["error"] = "{}: {}".format(type(e).__name__, e)
+    record["elapsed"] = time.time() - start
+    return record
@@ -7,16 +7,37 @@ import matplotlib
 # matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 from functools import lru_cache
+from stlu_window import slidingmin, slidingmax, slidinguntil, timedwindow, timeduntil
 
 
 # Import signal
 # signal = np.loadtxt("signal.txt")
 # print(signal)
 
-@lru_cache(maxsize=32)
+@lru_cache(maxsize=1024)
 def get_ppf(p:float):
 	return norm.ppf(p)
 
+"""z(cl) of the two-sided confidence interval, for one level or an array of levels (one ppf call for all of them)"""
+def zscore(cl):
+	p = 1 - (1 - np.asarray(cl, dtype=float)) / 2
+	if p.ndim == 0:
+		return get_ppf(float(p))
+	return norm.ppf(p)
+
+"""Confidence band of a whole trace at once: omega is (T, ..., 2) of (mean, sigma) rows.
+For one level the band is (T, ..., 2) [mean - z*sigma, mean + z*sigma]; for a vector of n_cl levels it is
+(T, ..., n_cl, 2), the level axis sits before the band axis so the monitor carries it like a batch axis."""
+def confband(omega, cl):
+	omega = np.asarray(omega, dtype=float)
+	z = zscore(cl)
+	mean = omega[..., 0]
+	sigma = omega[..., 1]
+	if np.ndim(z) > 0:
+		mean = mean[..., None]
+		sigma = sigma[..., None]
+	return np.stack((mean - z * sigma, mean + z * sigma), axis=-1)
+
 """This Returns the confidence interval of normal cdf
 Input: Mean Sigma Confidence Interval"""
 def normalconf(mean, sigma, conf):
@@ -160,7 +181,6 @@ def umonitor(requirement, t):
 		for ti in range(t1, t2+1):
 			pho1[ti-t1] = umonitor((varphi[0][0], varphi[0][1]), t+ti)
 			pho2[ti-t1] = umonitor((varphi[1][0], varphi[1][1]), t+ti)
-		pho3 = np.zeros((t2-t1+1, 2))
 		# for t in range(t1, t2+1):
 		# 	pho = np.min(pho1[:, :t-t1+1], axis=1)
 		# 	pho_low = min(pho[0], pho2[t - t1, 0])
@@ -168,16 +188,150 @@ def umonitor(requirement, t):
 		# 	pho3[t - t1] = np.array([pho_low, pho_up])
 		# pho = np.maximum(pho3[0, :], pho3[1, :])
 
-		for ti in range(t1, t2+1):
-			pho = np.min(pho1[:ti-t1+1], axis=0)
-			pho_low = min(pho[0], pho2[ti - t1, 0])
-			pho_up = min(pho[1], pho2[ti - t1, 1])			
-			pho3[ti - t1] = np.array([pho_low, pho_up])
+		# running minimum of pho1 over [t1, ti] for every ti in one pass
+		pho3 = np.minimum(np.minimum.accumulate(pho1, axis=0), pho2)
 		pho = np.max(pho3, axis=0) 
 
 	return pho
 
 
+"""Whole-signal version of umonitor: the [lower, upper] robustness of every time point at once.
+Same requirement format as umonitor, returns a (T, 2) array where row t equals umonitor(requirement, t).
+Time points whose windows run past the end of the trace are NaN (umonitor cannot evaluate them either).
+With a stlu_cache.DiskCache the result is looked up by content first."""
+def umonitor_signal(requirement, cache=None):
+	if cache is not None:
+		return cache.fetch(cache.key("umonitor", requirement), lambda: umonitor_signal(requirement))
+	req = requirement[0]
+	varphi = requirement[1]
+
+	if req[0] == "mu":
+		th = varphi[0]
+		cl = varphi[1]
+		pho = confband(req[1], cl) - th
+
+	elif req[0] == "neg":
+		pho = neg_signal(umonitor_signal((varphi[0], varphi[1])))
+
+	elif req[0] == "and":
+		pho1 = umonitor_signal((varphi[0][0], varphi[0][1]))
+		pho2 = umonitor_signal((varphi[1][0], varphi[1][1]))
+		pho = np.minimum(pho1, pho2)
+
+	elif req[0] == "always":
+		t1 = req[1][0]
+		t2 = req[1][1]
+		pho = slidingmin(umonitor_signal((varphi[0], varphi[1])), t1, t2)
+		pho[max(len(pho) - t2, 0):] = np.nan
+
+	elif req[0] == "eventually":
+		t1 = req[1][0]
+		t2 = req[1][1]
+		pho = slidingmax(umonitor_signal((varphi[0], varphi[1])), t1, t2)
+		pho[max(len(pho) - t2, 0):] = np.nan
+
+	elif req[0] == "until":
+		t1 = req[1][0]
+		t2 = req[1][1]
+		pho1 = umonitor_signal((varphi[0][0], varphi[0][1]))
+		pho2 = umonitor_signal((varphi[1][0], varphi[1][1]))
+		pho = slidinguntil(pho1, pho2, t1, t2)
+		pho[max(len(pho) - t2, 0):] = np.nan
+
+	return pho
+
+
+"""umonitor_signal of a trace sampled at arbitrary increasing times (sensor logs, event-driven feeds) without
+resampling: the intervals (t1, t2) of the requirement are in the units of time and every window is found by
+searchsorted. Returns (T, 2), the robustness at every sample; a time point whose window ends after the last sample
+is NaN like in umonitor_signal. Without interpolation a window holds the samples inside it (a gap with no sample
+gives NaN); with interpolation "previous" or "linear" the robustness of every subformula is also read at both ends
+of the window, interpolated between its samples (exact for a window over a mu, an approximation above it since
+the crossings of two subformulas between samples are not added).
+On time = np.arange(T) without interpolation it equals umonitor_signal."""
+def umonitor_timed(requirement, time, interpolation=None):
+	time = np.asarray(time, dtype=float)
+	req = requirement[0]
+	varphi = requirement[1]
+
+	if req[0] == "mu":
+		th = varphi[0]
+		cl = varphi[1]
+		pho = confband(req[1], cl) - th
+
+	elif req[0] == "neg":
+		pho = neg_signal(umonitor_timed((varphi[0], varphi[1]), time, interpolation))
+
+	elif req[0] == "and":
+		pho1 = umonitor_timed((varphi[0][0], varphi[0][1]), time, interpolation)
+		pho2 = umonitor_timed((varphi[1][0], varphi[1][1]), time, interpolation)
+		pho = np.minimum(pho1, pho2)
+
+	elif req[0] in ("always", "eventually"):
+		t1 = req[1][0]
+		t2 = req[1][1]
+		pho = timedwindow(umonitor_timed((varphi[0], varphi[1]), time, interpolation), time, t1, t2,
+			"min" if req[0] == "always" else "max", interpolation)
+		pho[time + t2 > time[-1]] = np.nan
+
+	elif req[0] == "until":
+		t1 = req[1][0]
+		t2 = req[1][1]
+		pho1 = umonitor_timed((varphi[0][0], varphi[0][1]), time, interpolation)
+		pho2 = umonitor_timed((varphi[1][0], varphi[1][1]), time, interpolation)
+		pho = timeduntil(pho1, pho2, time, t1, t2, interpolation)
+		pho[time + t2 > time[-1]] = np.nan
+
+	return pho
+
+
+"""Batched umonitor_signal over a stack of traces: the omega of every mu is (N, T, 2) and the result is (N, T, 2).
+If omega is given it replaces the signal of every mu, so one requirement can be run over a whole dataset."""
+def umonitor_batch(requirement, omega=None, cache=None):
+	if omega is not None:
+		omega = np.asarray(omega, dtype=float)
+	# time goes first so the window kernels broadcast along the batch axis
+	pho = umonitor_signal(map_requirement(requirement, lambda signal: np.swapaxes(signal if omega is None else omega, 0, 1)), cache)
+	return np.swapaxes(pho, 0, 1)
+
+
+"""umonitor_signal under every confidence level of cls at once, returns (n_cl, T, 2).
+The levels replace the cl of every mu; the monitor runs once with the levels as a trailing axis, so sweeping
+e.g. 0.5..0.99 costs one pass of the window kernels instead of one per level."""
+def umonitor_sweep(requirement, cls, cache=None):
+	cls = np.atleast_1d(np.asarray(cls, dtype=float))
+	pho = umonitor_signal(set_confidence(requirement, cls), cache)
+	return np.moveaxis(pho, -2, 0)
+
+
+"""Rebuild a requirement with cl as the confidence level of every mu"""
+def set_confidence(requirement, cl):
+	req = requirement[0]
+	varphi = requirement[1]
+	if req[0] == "mu":
+		return (req, (varphi[0], cl) + tuple(varphi[2:]))
+	elif req[0] in ("and", "until"):
+		return (req, (set_confidence(varphi[0], cl), set_confidence(varphi[1], cl)))
+	else:
+		return (req, set_confidence(varphi, cl))
+
+
+"""Rebuild a requirement with fn applied to the signal of every mu"""
+def map_requirement(requirement, fn):
+	req = requirement[0]
+	varphi = requirement[1]
+	if req[0] == "mu":
+		return ((req[0], fn(req[1])) + tuple(req[2:]), varphi)
+	elif req[0] in ("and", "until"):
+		return (req, (map_requirement(varphi[0], fn), map_requirement(varphi[1], fn)))
+	else:
+		return (req, map_requirement(varphi, fn))
+
+
+def neg_signal(varphi):
+	return - varphi[..., [1, 0]]
+
+
 def quan_to_boo(quan):
 	# print(quan[0], quan[1])
 	b = "NaN"
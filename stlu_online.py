@@ -0,0 +1,244 @@
+from collections import deque
+import operator as op
+import numpy as np
+from stlu_grammar import *
+from stlu_node_robustness import get_ppf
+"""
+File summary
+In this file, we will define an online STLU monitor for a parsed formula. Samples (mean, sigma) arrive one at a time,
+every time point gets its [lower, upper] robustness (same semantics as umonitor) as soon as the future horizon of the
+formula has been seen. Each temporal operator only keeps a window-sized buffer, so memory does not grow with the feed.
+Intervals are in samples, like the indices of umonitor.
+"""
+
+
+"""Incremental STLU monitor: push samples, get back the finalized (t, (lower, upper)) robustness bands"""
+class OnlineMonitor(object):
+    def __init__(self, formula, cl=0.95):
+        self.formula = formula
+        self.z = float(get_ppf(1 - (1 - cl) / 2))
+        self.root = _build(formula.subformula if isinstance(formula, Formula) else formula, self.z)
+        self.names = sorted(self.root.names)
+        self.horizon = self.root.delay
+        self.t = 0
+
+    """One sample: a mapping name -> (mean, sigma), or a (mean, sigma) pair when the formula reads one signal"""
+    def push(self, sample):
+        if not isinstance(sample, dict):
+            if len(self.names) != 1:
+                raise ValueError("Formula reads signals {}, give the sample as a dict".format(self.names))
+            sample = {self.names[0]: sample}
+        values = self.root.push(sample)
+        out = [(self.t + i, value) for i, value in enumerate(values)]
+        self.t += len(values)
+        return out
+
+    """A chunk of samples, e.g. an (n, 2) array of mean/sigma rows for a single-signal formula"""
+    def extend(self, samples):
+        out = []
+        for sample in samples:
+            out.extend(self.push(sample))
+        return out
+
+
+def _build(stl, z):
+    if isinstance(stl, (Globally, Eventually)):
+        return _Window(stl, _build(stl.subformula, z), min if isinstance(stl, Globally) else max)
+    elif isinstance(stl, Until):
+        return _Until(stl, _build(stl.left, z), _build(stl.right, z))
+    elif isinstance(stl, And):
+        return _Binary(_build(stl.left, z), _build(stl.right, z), lambda u, v: (min(u[0], v[0]), min(u[1], v[1])))
+    elif isinstance(stl, Or):
+        return _Binary(_build(stl.left, z), _build(stl.right, z), lambda u, v: (max(u[0], v[0]), max(u[1], v[1])))
+    elif isinstance(stl, Implies):
+        return _Binary(_build(stl.left, z), _build(stl.right, z), lambda u, v: (max(-u[1], v[0]), max(-u[0], v[1])))
+    elif isinstance(stl, Not):
+        return _Not(_build(stl.subformula, z))
+    elif isinstance(stl, (Constraint, Atom)):
+        return _Leaf(stl, z)
+    else:
+        raise NotImplementedError("No online monitor for {} of class {}".format(stl, stl.__class__))
+
+
+def _offsets(stl):
+    (left, right) = stl.interval
+    if isinstance(left, Param) or isinstance(right, Param):
+        raise ValueError("Set the parameters of {} before monitoring".format(stl))
+    if left > right:
+        raise ValueError("Interval [{},{}] empty for {}".format(left, right, stl))
+    return int(left), int(right)
+
+
+intervaltable = {
+    "+": lambda u, v: (u[0] + v[0], u[1] + v[1]),
+    "-": lambda u, v: (u[0] - v[1], u[1] - v[0]),
+    "*": lambda u, v: (min(u[0] * v[0], u[0] * v[1], u[1] * v[0], u[1] * v[1]), max(u[0] * v[0], u[0] * v[1], u[1] * v[0], u[1] * v[1])),
+    "/": lambda u, v: intervaltable["*"](u, (1.0 / v[1], 1.0 / v[0])),
+}
+
+
+"""Constraints and atoms: the band of the term comes from the confidence interval mean -/+ z*sigma of the samples"""
+class _Leaf(object):
+    def __init__(self, stl, z):
+        self.stl = stl
+        self.z = z
+        self.delay = 0
+        self.names = set()
+        if isinstance(stl, Atom):
+            self.names.add(stl.name)
+        else:
+            self._names(stl.term)
+            self._names(stl.bound)
+
+    def _names(self, term):
+        if isinstance(term, Expr):
+            self._names(term.left)
+            self._names(term.right)
+        elif isinstance(term, Var) and not _isnumber(term.name):
+            self.names.add(term.name)
+
+    def band(self, term, sample):
+        if isinstance(term, Expr):
+            return intervaltable[term.arithop](self.band(term.left, sample), self.band(term.right, sample))
+        elif isinstance(term, Var):
+            if _isnumber(term.name):
+                return (float(term.name), float(term.name))
+            (mean, sigma) = sample[term.name]
+            return (mean - self.z * sigma, mean + self.z * sigma)
+        elif isinstance(term, Constant):
+            return (float(term), float(term))
+        raise NotImplementedError("No band for {} of class {}".format(term, term.__class__))
+
+    def push(self, sample):
+        if isinstance(self.stl, Atom):
+            value = 1.0 if sample[self.stl.name][0] else 0.0
+            return [(value, value)]
+        term = self.band(self.stl.term, sample)
+        bound = self.band(self.stl.bound, sample)
+        if self.stl.relop in (">", ">="):
+            return [(term[0] - bound[1], term[1] - bound[0])]
+        elif self.stl.relop in ("<", "<="):
+            return [(bound[0] - term[1], bound[1] - term[0])]
+        (lower, upper) = (term[0] - bound[1], term[1] - bound[0])
+        if lower >= 0:
+            return [(-upper, -lower)]
+        elif upper <= 0:
+            return [(lower, upper)]
+        return [(-max(-lower, upper), 0.0)]
+
+
+class _Not(object):
+    def __init__(self, child):
+        self.child = child
+        self.delay = child.delay
+        self.names = child.names
+
+    def push(self, sample):
+        return [(-upper, -lower) for (lower, upper) in self.child.push(sample)]
+
+
+"""Pairs the outputs of two children, the faster child waits in a queue bounded by the difference of their delays"""
+class _Binary(object):
+    def __init__(self, left, right, combine):
+        self.left = left
+        self.right = right
+        self.combine = combine
+        self.delay = max(left.delay, right.delay)
+        self.names = left.names | right.names
+        self.lefts = deque()
+        self.rights = deque()
+
+    def pairs(self, sample):
+        self.lefts.extend(self.left.push(sample))
+        self.rights.extend(self.right.push(sample))
+        out = []
+        while self.lefts and self.rights:
+            out.append((self.lefts.popleft(), self.rights.popleft()))
+        return out
+
+    def push(self, sample):
+        return [self.combine(u, v) for (u, v) in self.pairs(sample)]
+
+
+"""Always (min) and eventually (max) over [t+a, t+b]: one monotone deque per bound of the band, at most b-a+1 entries"""
+class _Window(object):
+    def __init__(self, stl, child, reduce):
+        (self.a, self.b) = _offsets(stl)
+        self.child = child
+        self.delay = self.b + child.delay
+        self.names = child.names
+        self.better = op.lt if reduce is min else op.gt
+        self.windows = (deque(), deque())
+        self.j = 0
+
+    def push(self, sample):
+        out = []
+        for value in self.child.push(sample):
+            j = self.j
+            self.j += 1
+            t = j - self.b
+            for k in (0, 1):
+                window = self.windows[k]
+                while window and not self.better(window[-1][1], value[k]):
+                    window.pop()
+                window.append((j, value[k]))
+                while window[0][0] < t + self.a:
+                    window.popleft()
+            if t >= 0:
+                out.append((self.windows[0][0][1], self.windows[1][0][1]))
+        return out
+
+
+"""Until over [t+a, t+b] with the umonitor semantics, max over j of min(r[j], min(l[t+a..j])). A run of samples
+folds into (min of l, until value of the run) and two runs in a row combine associatively:
+(L1, V1) then (L2, V2) is (min(L1, L2), max(V1, min(L1, V2))). The last b-a+1 samples are kept as a queue of two
+stacks: new samples fold into the back, the front holds the folds from each sample to the end of the front (built
+by one backward pass when it runs empty), so every sample costs O(1) amortized."""
+class _Until(_Binary):
+    def __init__(self, stl, left, right):
+        _Binary.__init__(self, left, right, None)
+        (self.a, self.b) = _offsets(stl)
+        self.delay = self.b + max(left.delay, right.delay)
+        self.width = self.b - self.a + 1
+        self.front = []
+        self.back = []
+        self.folded = _empty
+        self.j = 0
+
+    def push(self, sample):
+        out = []
+        for (u, v) in self.pairs(sample):
+            # one fold per bound of the band: (L lower, V lower, L upper, V upper)
+            run = (u[0], min(u[0], v[0]), u[1], min(u[1], v[1]))
+            self.back.append(run)
+            self.folded = _then(self.folded, run)
+            if len(self.front) + len(self.back) > self.width:
+                if not self.front:
+                    folded = _empty
+                    for run in reversed(self.back):
+                        folded = _then(run, folded)
+                        self.front.append(folded)
+                    self.back = []
+                    self.folded = _empty
+                self.front.pop()
+            self.j += 1
+            if self.j > self.b:
+                value = _then(self.front[-1], self.folded) if self.front else self.folded
+                out.append((value[1], value[3]))
+        return out
+
+
+_empty = (np.inf, -np.inf, np.inf, -np.inf)
+
+
+def _then(first, second):
+    return (min(first[0], second[0]), max(first[1], min(first[0], second[1])),
+            min(first[2], second[2]), max(first[3], min(first[2], second[3])))
+
+
+def _isnumber(name):
+    try:
+        float(name)
+        return True
+    except ValueError:
+        return False
@@ -3,14 +3,18 @@ from stlu_grammar import *
 """dir: 1 indicates expanding direction, -1 indicates contraction direction, 0 idnicates no change in direction. (direction is decrement or increment of parameters)"""
 
 def getParamsDir(stl, dir):
-    if isinstance(stl, Globally):
+    if isinstance(stl, Formula):
+        return getParamsDir(stl.subformula, 0)
+    elif isinstance(stl, Globally):
         return list(set().union(getParamsDir(stl.interval, 1), getParamsDir(stl.subformula, 0) ) )
-    # elif isinstance(stl, Future):
-    #     return list(set().union(getParamsDir(stl.interval, -1), getParamsDir(stl.subformula, 0) ) )
-    elif isinstance(stl, Until): #expanding until op as well
-        return list(set().union(getParamsDir(stl.interval, 1), getParamsDir(stl.left, 0), getParamsDir(stl.right, 0) ) )
-    elif isinstance(stl, Mu):
-        pass
+    elif isinstance(stl, Eventually):
+        return list(set().union(getParamsDir(stl.interval, -1), getParamsDir(stl.subformula, 0) ) )
+    elif isinstance(stl, Until):
+        #until is existential over its window like eventually: a smaller right bound is harder to satisfy.
+        #Moving the left bound drops candidates but also shortens the prefix left must hold on, not monotone (0)
+        return list(set().union(getParamsDir(stl.interval.right, -1), [(p.name, 0) for p in getParams(stl.interval.left)], getParamsDir(stl.left, 0), getParamsDir(stl.right, 0) ) )
+    # elif isinstance(stl, Mu):
+    #     pass
     elif isinstance(stl, Interval):
         #For intervals
         #dir 1 means, expand as much as possible
@@ -21,17 +25,20 @@ def getParamsDir(stl, dir):
             return list(set().union(getParamsDir(stl.left, 1), getParamsDir(stl.right, -1)))      
         else:
             raise NotImplementedError
-    elif isinstance(stl, (Or, And, Implies, Expr)):
+    elif isinstance(stl, Implies):
+        #the premise is negated, so its directions flip
+        return list(set().union(flipParamsDir(getParamsDir(stl.left, 0)), getParamsDir(stl.right, 0)))
+    elif isinstance(stl, (Or, And, Expr)):
         return list(set().union(getParamsDir(stl.left, 0), getParamsDir(stl.right, 0)))
     elif isinstance(stl,Not):
-        return getParamsDir(stl.subformula, 0)
+        return flipParamsDir(getParamsDir(stl.subformula, 0))
     elif isinstance(stl, Constraint):
         if (stl.relop == "<" or stl.relop == "<="):
             return list(set().union(getParamsDir(stl.term,0), getParamsDir(stl.bound, -1)))
         elif (stl.relop == ">" or stl.relop == ">="):
             return list(set().union(getParamsDir(stl.term,0), getParamsDir(stl.bound, 1)))
         else:
-            list(set().union(getParamsDir(stl.term,0), getParamsDir(stl.bound, 0)))
+            return list(set().union(getParamsDir(stl.term,0), getParamsDir(stl.bound, 0)))
     elif isinstance(stl, (Atom, Var)):
         return []
     elif isinstance(stl, Param):
@@ -45,15 +52,21 @@ def getParamsDir(stl, dir):
         return NotImplementedError
 
 
+def flipParamsDir(dirs):
+    return [(name, -d) for (name, d) in dirs]
+
+
 def getParams(stl):
     # if isinstance(stl, (Globally, Future)):
     #     return list(set().union(getParams(stl.interval), getParams(stl.subformula)))
-    if isinstance(stl, Globally):
+    if isinstance(stl, Formula):
+        return getParams(stl.subformula)
+    if isinstance(stl, (Globally, Eventually)):
         return list(set().union(getParams(stl.interval), getParams(stl.subformula)))
     if isinstance(stl, Until):
         return list(set().union(getParams(stl.interval), getParams(stl.left), getParams(stl.right)))
-    elif isinstance(stl, Mu):
-        return list(set().union(getParams(stl.th), getParams(stl.cl), getParams(stl.t)))
+    # elif isinstance(stl, Mu):
+    #     return list(set().union(getParams(stl.th), getParams(stl.cl), getParams(stl.t)))
     elif isinstance(stl, (Interval, Or, And, Implies, Expr)):
         return list(set().union(getParams(stl.left), getParams(stl.right)))
     elif isinstance(stl,Not):
@@ -74,12 +87,14 @@ def getParams(stl):
 def setParams(stl,valuemap):
     # if isinstance(stl, (Globally, Future)):
     #     return eval(type(stl).__name__)(setParams(stl.interval, valuemap),setParams(stl.subformula, valuemap) )
-    if isinstance(stl, Globally):
+    if isinstance(stl, Formula):
+        return intern(Formula(stl.flag, setParams(stl.subformula, valuemap)))
+    if isinstance(stl, (Globally, Eventually)):
         return eval(type(stl).__name__)(setParams(stl.interval, valuemap),setParams(stl.subformula, valuemap) )
     if isinstance(stl, Until):
         return eval(type(stl).__name__)(setParams(stl.interval, valuemap),setParams(stl.left, valuemap),setParams(stl.right, valuemap) )
-    elif isinstance(stl, Mu):
-        return eval((type(stl).__name__)(setParams(stl.th, valuemap),setParams(stl.cl, valuemap),setParams(stl.t, valuemap) ))
+    # elif isinstance(stl, Mu):
+    #     return eval((type(stl).__name__)(setParams(stl.th, valuemap),setParams(stl.cl, valuemap),setParams(stl.t, valuemap) ))
     elif isinstance(stl, (Interval, Or, And, Implies)):
         return eval(type(stl).__name__)(setParams(stl.left,valuemap),setParams(stl.right, valuemap))
     elif isinstance(stl, Expr):
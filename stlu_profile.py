@@ -0,0 +1,193 @@
+import time
+import marshal
+from collections import OrderedDict
+import stlu_scorer
+import stlu_node_robustness
+from stlu_grammar import *
+"""
+File summary
+In this file, we will profile the scoring engines per formula node. Inside a Profiler context the singledispatch
+handlers of the scorers and the umonitor functions are replaced by timing wrappers, on exit the originals are put
+back, so nothing is measured (and nothing is slowed down) outside the context. For every node we record the calls,
+the cumulative and self time, the time points it was evaluated at and the span of its window (right - left, in
+time units for formulas, in samples for umonitor requirements). Nodes are keyed by id, their record holds the node
+so the id cannot be reused by another node while the profiler lives.
+Requirements of umonitor only carry the wrapper when they are called through the module: code holding its own
+reference to stlu_node_robustness.umonitor times the nodes below the root but not the root itself.
+"""
+
+dispatchers = ("qualitativescore", "quantitativescore", "smartscore")
+
+monitors = ("umonitor", "umonitor_signal", "umonitor_timed")
+
+
+class _Record(object):
+    def __init__(self, engine, node, label, window):
+        self.engine = engine
+        self.node = node
+        self.label = label
+        self.window = window
+        self.calls = 0
+        self.cumtime = 0.0
+        self.selftime = 0.0
+        self.points = set()
+        self.samples = 0
+        self.children = []
+        self.parents = []
+
+    """Number of time points evaluated: distinct t of the pointwise engines, signal lengths of the whole-signal monitors"""
+    def npoints(self):
+        return max(len(self.points), self.samples)
+
+
+"""Per-node profiler of the scoring engines, used as a context manager:
+with Profiler() as prof: quantitativescore(stl, x, 0)
+then prof.report() for the tree and prof.dump_stats(path) for pstats / snakeviz."""
+class Profiler(object):
+    def __init__(self, engines=dispatchers + monitors):
+        self.engines = engines
+        self.records = OrderedDict()
+        # (caller key, callee key) -> [calls, self time, cumulative time]
+        self.edges = {}
+        self.stack = []
+        self.saved = []
+
+    def __enter__(self):
+        for engine in self.engines:
+            if engine in dispatchers:
+                dispatcher = getattr(stlu_scorer, engine)
+                originals = dict((cls, func) for (cls, func) in dispatcher.registry.items() if cls is not object)
+                for (cls, func) in originals.items():
+                    dispatcher.register(cls, self._wrapnode(engine, func))
+                self.saved.append((engine, originals))
+            elif engine in monitors:
+                original = getattr(stlu_node_robustness, engine)
+                setattr(stlu_node_robustness, engine, self._wraprequirement(engine, original))
+                self.saved.append((engine, original))
+            else:
+                raise ValueError("Unknown engine {}".format(engine))
+        return self
+
+    def __exit__(self, *exc):
+        for (engine, original) in reversed(self.saved):
+            if engine in dispatchers:
+                dispatcher = getattr(stlu_scorer, engine)
+                for (cls, func) in original.items():
+                    dispatcher.register(cls, func)
+            else:
+                setattr(stlu_node_robustness, engine, original)
+        self.saved = []
+        return False
+
+    def _wrapnode(self, engine, func):
+        def wrapped(stl, x, t, *args, **kwargs):
+            key = (engine, id(stl))
+            if key not in self.records:
+                self.records[key] = _Record(engine, stl, _nodelabel(stl), _nodewindow(stl))
+            return self._call(key, t, None, func, (stl, x, t) + args, kwargs)
+        return wrapped
+
+    def _wraprequirement(self, engine, func):
+        def wrapped(requirement, *args, **kwargs):
+            key = (engine, id(requirement[0]), id(requirement[1]))
+            if key not in self.records:
+                self.records[key] = _Record(engine, requirement, _requirementlabel(requirement), _requirementwindow(requirement))
+            t = args[0] if engine == "umonitor" else None
+            return self._call(key, t, engine != "umonitor", func, (requirement,) + args, kwargs)
+        return wrapped
+
+    def _call(self, key, t, signal, func, args, kwargs):
+        record = self.records[key]
+        parent = self.stack[-1][0] if self.stack else None
+        if parent is not None and key not in self.records[parent].children:
+            self.records[parent].children.append(key)
+            record.parents.append(parent)
+        frame = [time.perf_counter(), 0.0]
+        self.stack.append((key, frame))
+        value = None
+        try:
+            value = func(*args, **kwargs)
+            return value
+        finally:
+            self.stack.pop()
+            total = time.perf_counter() - frame[0]
+            record.calls += 1
+            record.cumtime += total
+            record.selftime += total - frame[1]
+            if signal:
+                record.samples += len(value) if value is not None else 0
+            else:
+                record.points.add(t)
+            if self.stack:
+                self.stack[-1][1][1] += total
+            edge = self.edges.setdefault((parent, key), [0, 0.0, 0.0])
+            edge[0] += 1
+            edge[1] += total - frame[1]
+            edge[2] += total
+
+    def roots(self):
+        return [key for (key, record) in self.records.items() if not record.parents]
+
+    """Tree of the profiled nodes, one line per node: calls, cumulative and self time, time points, window"""
+    def report(self):
+        lines = []
+
+        def walk(key, depth):
+            record = self.records[key]
+            window = "" if record.window is None else "  window={}".format(record.window)
+            lines.append("{}{}  calls={} cum={:.3f}ms self={:.3f}ms points={}{}".format(
+                "  " * depth, record.label, record.calls, record.cumtime * 1e3, record.selftime * 1e3, record.npoints(), window))
+            for child in record.children:
+                walk(child, depth + 1)
+
+        for root in self.roots():
+            lines.append("[{}]".format(self.records[root].engine))
+            walk(root, 1)
+        return "\n".join(lines)
+
+    """Write the profile in the marshal format of pstats: pstats.Stats(path), snakeviz, gprof2dot ... can read it.
+    Every node is a function ('<engine>', node number, label)."""
+    def dump_stats(self, path):
+        names = dict((key, (record.engine, i, record.label[:80])) for (i, (key, record)) in enumerate(self.records.items()))
+        stats = {}
+        for (key, record) in self.records.items():
+            callers = dict((names[parent], (calls, calls, tt, ct)) for ((parent, callee), (calls, tt, ct)) in self.edges.items()
+                           if callee == key and parent is not None)
+            stats[names[key]] = (record.calls, record.calls, record.selftime, record.cumtime, callers)
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+def _nodelabel(stl):
+    if isinstance(stl, (Globally, Eventually, Until)):
+        return "{}{}".format(type(stl).__name__, stl.interval)
+    elif isinstance(stl, Formula):
+        return "Formula {}".format(stl.flag)
+    elif isinstance(stl, (Or, And, Implies, Not)):
+        return type(stl).__name__
+    return repr(stl)
+
+
+def _nodewindow(stl):
+    if isinstance(stl, (Globally, Eventually, Until)):
+        (left, right) = stl.interval
+        if isinstance(left, Param) or isinstance(right, Param):
+            return "{}".format(stl.interval)
+        return float(right) - float(left)
+    return None
+
+
+def _requirementlabel(requirement):
+    req = requirement[0]
+    if req[0] == "mu":
+        return "mu th={} cl={}".format(requirement[1][0], requirement[1][1])
+    elif req[0] in ("always", "eventually", "until"):
+        return "{}[{},{}]".format(req[0], req[1][0], req[1][1])
+    return req[0]
+
+
+def _requirementwindow(requirement):
+    req = requirement[0]
+    if req[0] in ("always", "eventually", "until"):
+        return req[1][1] - req[1][0]
+    return None
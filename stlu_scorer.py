@@ -1,5 +1,6 @@
 import sys
 import math
+import numpy as np
 from random import randint
 
 if (sys.version_info > (3, 0)):
@@ -8,6 +9,10 @@ else:
     from singledispatch import singledispatch
 
 from stlu_grammar import *
+from stlu_trace import Trace
+from stlu_compiler import compile
+from stlu_window import untilvalue
+from stlu_derived import derived
 import operator as op
 
 # Used single dispatch for polymorphism
@@ -16,30 +21,42 @@ def qualitativescore(stl, x, t, flag = None):
     raise NotImplementedError("No qualitativescore for {} of class {}".format(stl, stl.__class__))
 
 @qualitativescore.register(Globally)
-def _(stl, x, t, flag):
+def _(stl, x, t, flag = None):
     (left, right) = stl.interval
     left = float(left) 
     right = float(right)  
-    if flag == None:
-        flag = stl.flag
     if left>right:
         raise ValueError("Interval [{},{}] empty for {}".format(left, right, stl))
     (maxtime, rangetime) = gettime(x, t+left, t+right)
     return all(qualitativescore(stl.subformula, x, t1, flag) for t1 in rangetime)
 
-@qualitativescore.register(Mu)
-def _(stl, x, t, flag):
-    (threshold, confidence, time_last) = (stl.th, stl.cl, stl.t) 
-    if flag == None:
-        flag = stl.flag
-    threshold = float(threshold)
-    confidence = float(confidence)
-    time_last = float(time_last)
-    (maxtime, rangetime) = gettime(x, t, t+time_last)
-    if flag == "w":
-        return any([min(x - confidence, x + confidence) > threshold for t in rangetime])
-    else:
-        return all([min(x - confidence, x + confidence) > threshold for t in rangetime])
+@qualitativescore.register(Eventually)
+def _(stl, x, t, flag = None):
+    (left, right) = stl.interval
+    left = float(left) 
+    right = float(right)  
+    if left>right:
+        raise ValueError("Interval [{},{}] empty for {}".format(left, right, stl))
+    (maxtime, rangetime) = gettime(x, t+left, t+right)
+    return any(qualitativescore(stl.subformula, x, t1, flag) for t1 in rangetime)
+
+@qualitativescore.register(Formula)
+def _(stl, x, t, flag = None):
+    return qualitativescore(stl.subformula, x, t, stl.flag if flag == None else flag)
+
+# @qualitativescore.register(Mu)
+# def _(stl, x, t, flag):
+#     (threshold, confidence, time_last) = (stl.th, stl.cl, stl.t) 
+#     if flag == None:
+#         flag = stl.flag
+#     threshold = float(threshold)
+#     confidence = float(confidence)
+#     time_last = float(time_last)
+#     (maxtime, rangetime) = gettime(x, t, t+time_last)
+#     if flag == "w":
+#         return any([min(x - confidence, x + confidence) > threshold for t in rangetime])
+#     else:
+#         return all([min(x - confidence, x + confidence) > threshold for t in rangetime])
 # @qualitativescore.register(Future)
 # def _(stl, x, t):
 #     (left, right) = stl.interval
@@ -52,7 +69,7 @@ def _(stl, x, t, flag):
 
 
 @qualitativescore.register(Until)
-def _(stl, x, t, flag):
+def _(stl, x, t, flag = None):
     (left, right) = stl.interval
     left = float(left) 
     right = float(right) 
@@ -60,51 +77,65 @@ def _(stl, x, t, flag):
         raise ValueError("Interval [{},{}] empty for {}".format(left, right, stl))    
     (maxtime, rangetime) = gettime(x, t+left, t+right)
     #rangetime = filter(lambda v: (v<= right) & (v >= left), ts)
-    return (qualitativescore(stl.right, x, t) or any(  (qualitativescore(stl.right, x, t1) or  all (qualitativescore(stl.left, x, t2) for t2 in filter(lambda v: (v>= t) & (v<= t1) , rangetime) ) ) for t1 in rangetime) )
+    rangetime = list(rangetime)
+    lefts = [qualitativescore(stl.left, x, t1) for t1 in rangetime]
+    rights = [qualitativescore(stl.right, x, t1) for t1 in rangetime]
+    return qualitativescore(stl.right, x, t) or (len(rangetime) > 0 and untilvalue(lefts, rights))
 
 
 
 @qualitativescore.register(Or)
-def _(stl, x, t, flag):
+def _(stl, x, t, flag = None):
     return qualitativescore(stl.left, x, t) or qualitativescore(stl.right, x, t) 
 
 @qualitativescore.register(And)
-def _(stl, x, t, flag):
+def _(stl, x, t, flag = None):
     return qualitativescore(stl.left, x, t) and qualitativescore(stl.right, x, t) 
 
 @qualitativescore.register(Implies)
-def _(stl, x, t, flag):
+def _(stl, x, t, flag = None):
     return (not  qualitativescore(stl.left, x, t) ) or qualitativescore(stl.right, x, t)
 
 @qualitativescore.register(Not)
-def _(stl, x, t, flag):
+def _(stl, x, t, flag = None):
     if flag == "w": 
       return not qualitativescore(stl.subformula, x, t, "s")
+    return not qualitativescore(stl.subformula, x, t, "w")
 
 optable = { "<" : op.lt, ">" : op.gt, "<=" : op.le, ">=" : op.ge, "==": op.eq, "+" : op.add, "-" : op.sub, "*" : op.mul, "/" : op.truediv }
  
 @qualitativescore.register(Constraint)
-def _(stl, x, t):
+def _(stl, x, t, flag = None):
     return optable[stl.relop](getval(stl.term, x, t), getval(stl.bound, x, t))
 
 @qualitativescore.register(Atom)
-def _(stl, x, t):
-    return x[stl.name][t]
+def _(stl, x, t, flag = None):
+    return getsignal(x, stl.name, t)
 
 
 @singledispatch
 
 def getval(term, x, t):
-    raise NotImplementedError("No getval for {} of class {}".format(stl, stl.__class__))
+    raise NotImplementedError("No getval for {} of class {}".format(term, term.__class__))
 
 
 @getval.register(Expr)
 def _(term, x, t):
+    if isinstance(x, Trace) and x.interpolation is None:
+        # the whole term is computed once per trace and shared by every constraint
+        value = derived(term, x)
+        return value if np.ndim(value) == 0 else value[x.index(t)]
     return optable[term.arithop](getval(term.left, x, t), getval(term.right, x, t))
 
 @getval.register(Var)
 def _(term, x, t):
-    return x[term.name][t]
+    if term.name not in x:
+        # numbers in a constraint parse as Var, the id rule also matches digits
+        try:
+            return float(term.name)
+        except ValueError:
+            raise KeyError("No signal {} in trace".format(term.name))
+    return getsignal(x, term.name, t)
 
 @getval.register(Constant)
 def _(term, x, t):
@@ -126,6 +157,16 @@ def _(stl, x, t):
     (maxtime, rangetime) = gettime(x, t+left, t+right)
     return  min(quantitativescore(stl.subformula, x, t1) for t1 in rangetime)
 
+@quantitativescore.register(Eventually)
+def _(stl, x, t):
+    (left, right) = stl.interval
+    (maxtime, rangetime) = gettime(x, t+left, t+right)
+    return max(quantitativescore(stl.subformula, x, t1) for t1 in rangetime)
+
+@quantitativescore.register(Formula)
+def _(stl, x, t):
+    return quantitativescore(stl.subformula, x, t)
+
 # @quantitativescore.register(Future)
 # def _(stl, x, t):
 #     (left, right) = stl.interval
@@ -148,7 +189,10 @@ def _(stl, x, t):
     #        print("   t2  ", t2, stl.left, quantitativescore(stl.left, x, t2) )
     #    print(filter(lambda v: (v>= t) & (v<= t1) , rangetime) )
     #    print(min (qualitativescore(stl.left, x, t2) for t2 in filter(lambda v: (v>= t) & (v< t1) , rangetime) ) )
-    return max(quantitativescore(stl.right, x, t), max( min (quantitativescore(stl.right, x, t1), min (quantitativescore(stl.left, x, t2) for t2 in filter(lambda v: (v>= t) & (v<= t1) , rangetime) ) ) for t1 in rangetime) )
+    rangetime = list(rangetime)
+    lefts = [quantitativescore(stl.left, x, t1) for t1 in rangetime]
+    rights = [quantitativescore(stl.right, x, t1) for t1 in rangetime]
+    return max(quantitativescore(stl.right, x, t), untilvalue(lefts, rights))
 
 
 
@@ -179,7 +223,7 @@ def _(stl, x, t):
 
 @quantitativescore.register(Atom)
 def _(stl, x, t):
-    if x[stl.name][t]:
+    if getsignal(x, stl.name, t):
         return 1
     else:
         return 0
@@ -188,6 +232,14 @@ def _(stl, x, t):
 
 
 
+"""Batched quantitativescore: robustness of every time point of every trace in data at once.
+data is (N, T) for one signal or (N, T, k) for k signals named by names, the result is (N, T)."""
+def quantitativescore_batch(stl, data, names=("x",), valuemap=None, cache=None):
+    trace = Trace.frombatch(data, names)
+    return compile(stl)(trace, valuemap, cache).T
+
+
+
 @singledispatch
 def smartscore(stl, x, t):
     raise NotImplementedError("No smartscore for {} of class {}".format(stl, stl.__class__))
@@ -200,6 +252,17 @@ def _(stl, x, t):
     #rangetime =  x[(x['time'] <= right) & (x['time'] >= left)]["time"]
     return  2/(1 + math.exp(-0.01 * intervalwidth) ) * min(smartscore(stl.subformula, x, t1) for t1 in rangetime)
 
+@smartscore.register(Eventually)
+def _(stl, x, t):
+    (left, right) = stl.interval
+    intervalwidth = right - left + 1
+    (maxtime, rangetime) = gettime(x, t+left, t+right)
+    return  2/(1 + math.exp(0.01 * intervalwidth) ) * max(smartscore(stl.subformula, x, t1) for t1 in rangetime)
+
+@smartscore.register(Formula)
+def _(stl, x, t):
+    return smartscore(stl.subformula, x, t)
+
 # @smartscore.register(Future)
 # def _(stl, x, t):
 #     (left, right) = stl.interval
@@ -224,7 +287,10 @@ def _(stl, x, t):
     #        print("   t2  ", t2, stl.left, quantitativescore(stl.left, x, t2) )
     #    print(filter(lambda v: (v>= t) & (v<= t1) , rangetime) )
     #    print(min (qualitativescore(stl.left, x, t2) for t2 in filter(lambda v: (v>= t) & (v< t1) , rangetime) ) )
-    return 2/(1 + math.exp(-0.01 * intervalwidth) ) * max(quantitativescore(stl.right, x, t), max( min (quantitativescore(stl.right, x, t1), min (quantitativescore(stl.left, x, t2) for t2 in filter(lambda v: (v>= t) & (v<= t1) , rangetime) ) ) for t1 in rangetime) )
+    rangetime = list(rangetime)
+    lefts = [quantitativescore(stl.left, x, t1) for t1 in rangetime]
+    rights = [quantitativescore(stl.right, x, t1) for t1 in rangetime]
+    return 2/(1 + math.exp(-0.01 * intervalwidth) ) * max(quantitativescore(stl.right, x, t), untilvalue(lefts, rights))
 
 
 @smartscore.register(Or)
@@ -259,7 +325,7 @@ def _(stl, x, t):
 
 @smartscore.register(Atom)
 def _(stl, x, t):
-    if x[stl.name][t]:
+    if getsignal(x, stl.name, t):
         return 1
     else:
         return 0
@@ -268,7 +334,14 @@ def _(stl, x, t):
 
 
 def gettime(x, left, right):
+    if isinstance(x, Trace):
+        return x.time[-1], x.window(left, right)
     ts = sorted(x['time'].keys())
     maxtime = ts[-1]
     rangetime = filter(lambda v: (v<= right) & (v >= left), ts)
     return maxtime, rangetime
+
+def getsignal(x, name, t):
+    if isinstance(x, Trace):
+        return x.value(name, t)
+    return x[name][t]
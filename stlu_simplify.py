@@ -0,0 +1,198 @@
+from stlu_grammar import *
+from stlu_compiler import robusttable
+from stlu_derived import arithtable
+"""
+File summary
+In this file, we will simplify a parsed formula before it is scored: negations are pushed down to the constraints
+(negation normal form), constant arithmetic is folded, constraints between two numbers become true or false and are
+absorbed by the conjunctions/disjunctions around them, nested always/eventually with constant intervals are merged
+and repeated conjuncts/disjuncts are dropped. The result is interned (see stlu_grammar.intern).
+The rewrites keep the robustness of quantitativescore, the compiler and the STLU bands of umonitor: negating a band
+[l, u] gives [-u, -l] exactly, so the strong/weak flag of the Formula reads the simplified formula the same way.
+smartscore weighs always and eventually differently, it is not invariant under the negation rewrites.
+A constant constraint is the exception: true and false are (inf > 0) and (inf < 0), robustness +inf and -inf, so
+(1 > 0) & f is exactly f, but a constant constraint left on its own reads +-inf instead of its margin. Only
+constraints with a nonzero margin are folded, so the sign of the robustness (r >= 0 holds) never changes: (3 < 3)
+has margin 0 and holds, it stays as it is.
+"""
+
+# relop of the negated constraint, same robustness: -(x - c) == c - x
+negtable = { ">" : "<=", ">=" : "<", "<" : ">=", "<=" : ">" }
+
+
+"""Simplified, interned copy of a formula"""
+def simplify(stl):
+    if isinstance(stl, Formula):
+        return intern(Formula(stl.flag, _simplify(stl.subformula, False)))
+    return _simplify(stl, False)
+
+
+"""Simplify and report the estimated cost: (simplified, cost before, cost after), costs from evalCost"""
+def simplifyReport(stl):
+    simplified = simplify(stl)
+    return simplified, evalCost(stl), evalCost(simplified)
+
+
+"""Estimated cost of quantitativescore at one time point: the number of operator and leaf evaluations.
+The scorer evaluates the subformula again for every sample of a window, so a temporal operator multiplies the
+cost of its subformula by the window width (in samples, the widest one for parametric bounds)."""
+def evalCost(stl):
+    if isinstance(stl, Formula):
+        return evalCost(stl.subformula)
+    elif isinstance(stl, (Globally, Eventually)):
+        return 1 + _width(stl.interval) * evalCost(stl.subformula)
+    elif isinstance(stl, Until):
+        return 1 + _width(stl.interval) * (1 + evalCost(stl.left) + evalCost(stl.right))
+    elif isinstance(stl, (Or, And, Implies, Expr)):
+        return 1 + evalCost(stl.left) + evalCost(stl.right)
+    elif isinstance(stl, Not):
+        return 1 + evalCost(stl.subformula)
+    elif isinstance(stl, Constraint):
+        return 1 + evalCost(stl.term) + evalCost(stl.bound)
+    return 1
+
+
+def _width(interval):
+    left = interval.left.left if isinstance(interval.left, Param) else interval.left
+    right = interval.right.right if isinstance(interval.right, Param) else interval.right
+    return max(float(right) - float(left) + 1, 1)
+
+
+"""One bottom-up pass. negate says whether an odd number of negations sits above stl: it is pushed into the node
+instead of being kept as a Not, by duality (not G = E not, not (a & b) = not a | not b, not (x > c) = x <= c).
+Until has no dual in the grammar and == no negated relop, those keep their Not."""
+def _simplify(stl, negate):
+    if isinstance(stl, Not):
+        return _simplify(stl.subformula, not negate)
+    elif isinstance(stl, Implies):
+        # a -> b is (not a) | b
+        if negate:
+            return _junction(And, _simplify(stl.left, False), _simplify(stl.right, True))
+        return _junction(Or, _simplify(stl.left, True), _simplify(stl.right, False))
+    elif isinstance(stl, (And, Or)):
+        kind = type(stl)
+        if negate:
+            kind = Or if kind is And else And
+        return _junction(kind, _simplify(stl.left, negate), _simplify(stl.right, negate))
+    elif isinstance(stl, (Globally, Eventually)):
+        kind = type(stl)
+        if negate:
+            kind = Eventually if kind is Globally else Globally
+        return _temporal(kind, stl.interval, _simplify(stl.subformula, negate))
+    elif isinstance(stl, Until):
+        node = intern(Until(stl.interval, _simplify(stl.left, False), _simplify(stl.right, False)))
+        return intern(Not(node)) if negate else node
+    elif isinstance(stl, Constraint):
+        term = _fold(stl.term)
+        bound = _fold(stl.bound)
+        truth = _truth(Constraint(stl.relop, term, bound))
+        if truth is not None:
+            return _constant(truth != negate)
+        if not negate:
+            return intern(Constraint(stl.relop, term, bound))
+        if stl.relop in negtable:
+            return intern(Constraint(negtable[stl.relop], term, bound))
+        return intern(Not(Constraint(stl.relop, term, bound)))
+    elif isinstance(stl, Atom):
+        return intern(Not(stl)) if negate else intern(stl)
+    else:
+        raise NotImplementedError("No simplify for {} of class {}".format(stl, stl.__class__))
+
+
+"""And/Or of two simplified operands: nested same-kind operands are flattened and repeats dropped (min and max are
+associative, commutative and idempotent). Operands are interned, so a repeat is the same object. true is dropped
+from a conjunction and decides a disjunction, false the other way round."""
+def _junction(kind, left, right):
+    unit = kind is And
+    operands = []
+    for child in (left, right):
+        for operand in (_operands(child) if type(child) is kind else [child]):
+            truth = _truth(operand)
+            if truth is not None:
+                if truth != unit:
+                    return _constant(truth)
+            elif not any(operand is seen for seen in operands):
+                operands.append(operand)
+    if not operands:
+        return _constant(unit)
+    node = operands[0]
+    for operand in operands[1:]:
+        node = intern(kind(node, operand))
+    return node
+
+
+def _operands(stl):
+    if type(stl) in (And, Or):
+        out = []
+        for child in (stl.left, stl.right):
+            out.extend(_operands(child) if type(child) is type(stl) else [child])
+        return out
+    return [stl]
+
+
+"""G[a,b] G[c,d] f is G[a+c,b+d] f and the same for E: the windows [t1+c, t1+d] for t1 in [t+a, t+b] cover
+[t+a+c, t+b+d] exactly when time advances by whole samples. The intervals must be constant, whole and
+non-negative. With windows cut at the end of the trace the nested formula is undefined (NaN) once the inner window
+of t+b is empty, t+b+c past the end, while the merged one runs on to t+a+c. For c > 0 the merged formula is put in
+a conjunction with G[b+c,b+c] true, +inf where that sample exists and NaN past it, so both have the same values and
+the same NaN tail."""
+def _temporal(kind, interval, subformula):
+    if type(subformula) is kind and _mergeable(interval) and _mergeable(subformula.interval):
+        inner = subformula.interval
+        merged = intern(kind(Interval(Constant(float(interval.left) + float(inner.left)), Constant(float(interval.right) + float(inner.right))), subformula.subformula))
+        if float(inner.left) == 0:
+            return merged
+        edge = Constant(float(interval.right) + float(inner.left))
+        return intern(And(merged, intern(Globally(Interval(edge, edge), _constant(True)))))
+    return intern(kind(interval, subformula))
+
+
+def _mergeable(interval):
+    if isinstance(interval.left, Param) or isinstance(interval.right, Param):
+        return False
+    (left, right) = (float(interval.left), float(interval.right))
+    return left.is_integer() and right.is_integer() and 0 <= left <= right
+
+
+"""Fold the arithmetic of a term: operations on two numbers become a Constant, x+0, x-0, x*1, x/1 become x.
+Numbers in a constraint parse as Var (the id rule also matches digits)."""
+def _fold(term):
+    if isinstance(term, Expr):
+        left = _fold(term.left)
+        right = _fold(term.right)
+        (u, v) = (_number(left), _number(right))
+        if u is not None and v is not None and not (term.arithop == "/" and v == 0):
+            return intern(Constant(arithtable[term.arithop](u, v)))
+        if v == 0 and term.arithop in ("+", "-") or v == 1 and term.arithop in ("*", "/"):
+            return left
+        if u == 0 and term.arithop == "+" or u == 1 and term.arithop == "*":
+            return right
+        return intern(Expr(term.arithop, left, right))
+    return intern(term)
+
+
+"""Truth value of a constraint between two numbers read from the sign of its robustness margin, None for anything
+else and for a zero margin (it holds, r >= 0, but its negation holds too)"""
+def _truth(stl):
+    if isinstance(stl, Constraint):
+        (u, v) = (_number(stl.term), _number(stl.bound))
+        if u is not None and v is not None:
+            margin = robusttable[stl.relop](u, v)
+            if margin != 0:
+                return bool(margin > 0)
+    return None
+
+
+def _constant(truth):
+    return intern(Constraint(">" if truth else "<", Constant(float("inf")), Constant(0.0)))
+
+
+def _number(term):
+    if isinstance(term, Constant):
+        return float(term)
+    elif isinstance(term, Var):
+        try:
+            return float(term.name)
+        except ValueError:
+            return None
+    return None
@@ -0,0 +1,335 @@
+import numpy as np
+from stlu_grammar import *
+from stlu_trace import Trace
+from stlu_parametrizer import getParams
+"""
+File summary
+In this file, we will compute a smooth robustness of a whole trace (or batch of traces, see Trace.frombatch) together
+with its exact gradient with respect to every Param, so gradient-based synthesis needs one forward and one backward
+pass per step instead of finite differences. min and max become log-sum-exp with a temperature (the hard robustness
+of the compiler is the limit temperature -> 0). A parametric interval bound is a sigmoid edge on the window with a
+sharpness (1 / time unit), so moving it changes the value smoothly.
+Windows are cut at the end of the trace like the compiler does, a time point whose window is empty gets NaN.
+The trace must be regularly sampled.
+"""
+
+
+"""Smooth robustness at time index t and its gradient: (value, {parameter name: gradient}), both of the batch shape
+of the trace (scalars for a single trace)"""
+def smoothScore(stl, trace, valuemap, t=0, temperature=1.0, sharpness=10.0):
+    (signal, back) = smoothSignal(stl, trace, valuemap, temperature, sharpness)
+    seed = np.zeros(signal.shape)
+    seed[t] = 1.0
+    grads = dict((p.name, np.zeros(signal.shape[1:])) for p in getParams(stl))
+    if back is not None:
+        back(seed, grads)
+    return signal[t], grads
+
+
+"""Smooth robustness of every time point and its backward function: back(g, grads) adds the gradient of
+sum(g * signal) to grads[name] for every parameter (None if the formula has no parameter)"""
+def smoothSignal(stl, trace, valuemap, temperature=1.0, sharpness=10.0):
+    if not isinstance(trace, Trace):
+        trace = Trace.fromarray(trace)
+    if not trace.regular:
+        raise ValueError("Smooth robustness needs a regularly sampled trace")
+    (value, back) = _smooth(stl, _Context(trace, valuemap, float(temperature), float(sharpness)))
+    if np.ndim(value) == 0:
+        value = np.full(trace.shape, float(value))
+    return value, back
+
+
+class _Context(object):
+    def __init__(self, trace, valuemap, temperature, sharpness):
+        self.trace = trace
+        self.valuemap = valuemap
+        self.temperature = temperature
+        self.sharpness = sharpness
+
+
+def _smooth(stl, ctx):
+    if isinstance(stl, Formula):
+        return _smooth(stl.subformula, ctx)
+    elif isinstance(stl, (Globally, Eventually)):
+        return _window(stl, ctx, -1 if isinstance(stl, Globally) else 1)
+    elif isinstance(stl, Until):
+        return _until(stl, ctx)
+    elif isinstance(stl, (And, Or)):
+        return _pair(_smooth(stl.left, ctx), _smooth(stl.right, ctx), ctx, -1 if isinstance(stl, And) else 1)
+    elif isinstance(stl, Implies):
+        return _pair(_negate(_smooth(stl.left, ctx)), _smooth(stl.right, ctx), ctx, 1)
+    elif isinstance(stl, Not):
+        return _negate(_smooth(stl.subformula, ctx))
+    elif isinstance(stl, Constraint):
+        return _constraint(stl, ctx)
+    elif isinstance(stl, Atom):
+        return (np.asarray(ctx.trace[stl.name]) != 0).astype(float), None
+    else:
+        raise NotImplementedError("No smooth robustness for {} of class {}".format(stl, stl.__class__))
+
+
+"""Sum a gradient down to the shape of the value it belongs to: scalars (constants, parameters) are broadcast
+along time, their gradient keeps only the batch axes"""
+def _fit(g, value):
+    if np.ndim(value) == 0 and np.ndim(g) > 0:
+        return g.sum(axis=0)
+    return g
+
+
+def _negate(node):
+    (value, back) = node
+    return -value, None if back is None else (lambda g, grads: back(-g, grads))
+
+
+"""Soft max (sign 1) or soft min (sign -1) of two values: sign * T * log(exp(sign*u/T) + exp(sign*v/T))"""
+def _pair(left, right, ctx, sign):
+    ((u, backu), (v, backv)) = (left, right)
+    (value, pu, pv) = _softpair(np.asarray(u, dtype=float), np.asarray(v, dtype=float), ctx.temperature, sign)
+    if backu is None and backv is None:
+        return value, None
+
+    def back(g, grads):
+        if backu is not None:
+            backu(_fit(g * pu, u), grads)
+        if backv is not None:
+            backv(_fit(g * pv, v), grads)
+    return value, back
+
+
+def _constraint(stl, ctx):
+    (term, backt) = _term(stl.term, ctx)
+    (bound, backb) = _term(stl.bound, ctx)
+    if stl.relop in (">", ">="):
+        (value, dt) = (term - bound, 1.0)
+    elif stl.relop in ("<", "<="):
+        (value, dt) = (bound - term, -1.0)
+    else:
+        (value, dt) = (-np.abs(term - bound), -np.sign(term - bound))
+    if backt is None and backb is None:
+        return value, None
+
+    def back(g, grads):
+        if backt is not None:
+            backt(_fit(g * dt, term), grads)
+        if backb is not None:
+            backb(_fit(-g * dt, bound), grads)
+    return value, back
+
+
+def _term(term, ctx):
+    if isinstance(term, Expr):
+        (u, backu) = _term(term.left, ctx)
+        (v, backv) = _term(term.right, ctx)
+        op = term.arithop
+        if op == "+":
+            (value, du, dv) = (u + v, 1.0, 1.0)
+        elif op == "-":
+            (value, du, dv) = (u - v, 1.0, -1.0)
+        elif op == "*":
+            (value, du, dv) = (u * v, v, u)
+        else:
+            (value, du, dv) = (u / v, 1.0 / v, -u / (v * v))
+        if backu is None and backv is None:
+            return value, None
+
+        def back(g, grads):
+            if backu is not None:
+                backu(_fit(g * du, u), grads)
+            if backv is not None:
+                backv(_fit(g * dv, v), grads)
+        return value, back
+    elif isinstance(term, Param):
+        if term.name not in ctx.valuemap:
+            raise KeyError("No value for parameter {}".format(term.name))
+
+        def back(g, grads):
+            grads[term.name] = grads[term.name] + g
+        return float(ctx.valuemap[term.name]), back
+    elif isinstance(term, Var):
+        try:
+            # numbers in a constraint parse as Var, the id rule also matches digits
+            return float(term.name), None
+        except ValueError:
+            return np.asarray(ctx.trace[term.name], dtype=float), None
+    elif isinstance(term, Constant):
+        return float(term), None
+    raise NotImplementedError("No smooth robustness for {} of class {}".format(term, term.__class__))
+
+
+"""Sample offsets a window can reach and, per offset, the log weight and its derivatives in the interval bounds.
+A constant bound cuts the offsets hard, a parametric one reaches over its whole range with a sigmoid edge:
+log w = log sigmoid(k (s - a)) + log sigmoid(k (b - s)) for the offset time s."""
+def _edges(interval, ctx):
+    (left, right) = interval
+    step = float(ctx.trace.step)
+    lo = float(left.left if isinstance(left, Param) else left)
+    hi = float(right.right if isinstance(right, Param) else right)
+    offsets = np.arange(int(np.ceil(lo / step - 1e-9)), int(np.floor(hi / step + 1e-9)) + 1)
+    logw = np.zeros(len(offsets))
+    edges = []
+    for (bound, sign) in ((left, 1.0), (right, -1.0)):
+        edge = _edge(bound, sign, offsets * step, ctx)
+        if edge is not None:
+            logw = logw + edge[0]
+            edges.append(edge[1:])
+    return offsets, logw, edges
+
+
+"""Sigmoid edge of one bound at the offset times s: (log weight, parameter name, derivative of the log weight in
+the parameter), None for a constant bound. sign 1 for a left bound, -1 for a right one."""
+def _edge(bound, sign, s, ctx):
+    if not isinstance(bound, Param):
+        return None
+    if bound.name not in ctx.valuemap:
+        raise KeyError("No value for parameter {}".format(bound.name))
+    z = sign * ctx.sharpness * (s - float(ctx.valuemap[bound.name]))
+    # d log sigmoid(z) / d bound = sigmoid(-z) * dz / d bound
+    return -np.logaddexp(0.0, -z), bound.name, -sign * ctx.sharpness * np.exp(-np.logaddexp(0.0, z))
+
+
+"""Gather x[t + offsets[j]] into a (T, W, ...) array, -inf where the offset falls off the trace"""
+def _gather(x, offsets, fill):
+    n = x.shape[0]
+    out = np.full((n, len(offsets)) + x.shape[1:], fill)
+    for (j, d) in enumerate(offsets):
+        (first, last) = (max(0, -d), min(n, n - d))
+        if first < last:
+            out[first:last, j] = x[first + d:last + d]
+    return out
+
+
+def _scatter(dx, gathered, offsets):
+    n = dx.shape[0]
+    for (j, d) in enumerate(offsets):
+        (first, last) = (max(0, -d), min(n, n - d))
+        if first < last:
+            dx[first + d:last + d] += gathered[first:last, j]
+
+
+"""Soft min (sign -1) or soft max (sign 1) over the window of every time point"""
+def _window(stl, ctx, sign):
+    (x, backx) = _smooth(stl.subformula, ctx)
+    x = np.asarray(x, dtype=float) * np.ones(ctx.trace.shape)
+    (offsets, logw, edges) = _edges(stl.interval, ctx)
+    tau = ctx.temperature
+    X = _gather(sign * x / tau, offsets, -np.inf)
+    logw = logw.reshape((1, len(offsets)) + (1,) * (x.ndim - 1))
+    z = X + logw
+    top = np.max(z, axis=1, initial=-np.inf) if len(offsets) else np.full(x.shape, -np.inf)
+    empty = ~np.isfinite(top) & ~np.isnan(top)
+    top = np.where(empty, 0.0, top)
+    e = np.exp(z - top[:, None])
+    total = e.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = sign * tau * (np.log(total) + top)
+    value[empty] = np.nan
+    if backx is None and not edges:
+        return value, None
+    with np.errstate(invalid='ignore'):
+        p = e / total[:, None]
+
+    def back(g, grads):
+        g = np.where(empty, 0.0, g)
+        weighted = g[:, None] * p
+        for (name, dlogw) in edges:
+            d = dlogw.reshape(logw.shape)
+            grads[name] = grads[name] + sign * tau * np.nansum(weighted * d, axis=(0, 1))
+        if backx is not None:
+            dx = np.zeros(x.shape)
+            _scatter(dx, np.nan_to_num(weighted), offsets)
+            backx(dx, grads)
+    return value, back
+
+
+"""Smooth until over the window [t+a, t+b]: soft max over j of soft min(r[j], soft min(l[t+a..j])),
+then soft max with r[t] like the compiler. The running soft min is carried offset by offset, vectorized over t,
+and the local derivatives are kept for the backward pass. Parametric bounds weigh the candidates j with their
+sigmoid edges as in _window, a parametric left bound also raises every l before its edge by -T log w, so those
+drop out of the running soft min."""
+def _until(stl, ctx):
+    (l, backl) = _smooth(stl.left, ctx)
+    (r, backr) = _smooth(stl.right, ctx)
+    tau = ctx.temperature
+    l = np.asarray(l, dtype=float) * np.ones(ctx.trace.shape)
+    r = np.asarray(r, dtype=float) * np.ones(ctx.trace.shape)
+    (offsets, logw, edges) = _edges(stl.interval, ctx)
+    W = len(offsets)
+    shape = (1, W) + (1,) * (l.ndim - 1)
+    start = _edge(stl.interval.left, 1.0, offsets * float(ctx.trace.step), ctx)
+    L = _gather(l, offsets, np.nan)
+    if start is not None:
+        L = L - tau * start[0].reshape(shape)
+    R = _gather(r, offsets, np.nan)
+    V = _gather(np.ones(l.shape, dtype=bool), offsets, False)
+    # m_j running soft min of l from the window start, c_j = softmin(r_j, m_j)
+    m = np.full(L.shape, np.nan)
+    dm_prev = np.zeros(L.shape)
+    dm_l = np.zeros(L.shape)
+    c = np.full(L.shape, np.nan)
+    dc_r = np.zeros(L.shape)
+    dc_m = np.zeros(L.shape)
+    for j in range(W):
+        valid = V[:, j]
+        if j == 0:
+            m[:, 0] = np.where(valid, L[:, 0], np.nan)
+            dm_l[:, 0] = valid
+        else:
+            # the window of t starts at its first offset on the trace
+            started = V[:, j - 1]
+            (v, pa, pb) = _softpair(m[:, j - 1], L[:, j], tau, -1)
+            m[:, j] = np.where(valid, np.where(started, v, L[:, j]), np.nan)
+            dm_prev[:, j] = np.where(valid & started, pa, 0.0)
+            dm_l[:, j] = np.where(valid, np.where(started, pb, 1.0), 0.0)
+        (v, pa, pb) = _softpair(R[:, j], m[:, j], tau, -1)
+        c[:, j] = v
+        dc_r[:, j] = np.where(valid, pa, 0.0)
+        dc_m[:, j] = np.where(valid, pb, 0.0)
+    z = np.where(V, c / tau + logw.reshape(shape), -np.inf)
+    empty = ~V.any(axis=1) if W else np.ones(l.shape, dtype=bool)
+    top = np.max(z, axis=1, initial=-np.inf) if W else np.zeros(l.shape)
+    top = np.where(empty, 0.0, top)
+    e = np.where(V, np.exp(np.where(V, z, top[:, None]) - top[:, None]), 0.0) if W else np.zeros(L.shape)
+    total = e.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        window = tau * (np.log(total) + top)
+        p = e / total[:, None]
+    (value, pr, pw) = _softpair(r, window, tau, 1)
+    value = np.where(empty, np.nan, value)
+    if backl is None and backr is None and not edges:
+        return value, None
+
+    def back(g, grads):
+        g = np.where(empty, 0.0, g)
+        dr = g * pr
+        dc = (g * pw)[:, None] * np.nan_to_num(p)
+        dm = dc * dc_m
+        dL = np.zeros(L.shape)
+        for j in range(W - 1, -1, -1):
+            dL[:, j] = dm[:, j] * dm_l[:, j]
+            if j > 0:
+                dm[:, j - 1] += dm[:, j] * dm_prev[:, j]
+        for (name, dlogw) in edges:
+            grads[name] = grads[name] + tau * np.nansum(dc * dlogw.reshape(shape), axis=(0, 1))
+        if start is not None:
+            grads[start[1]] = grads[start[1]] - tau * np.nansum(dL * start[2].reshape(shape), axis=(0, 1))
+        if backl is not None:
+            dl = np.zeros(l.shape)
+            _scatter(dl, dL, offsets)
+            backl(dl, grads)
+        if backr is not None:
+            _scatter(dr, dc * dc_r, offsets)
+            backr(dr, grads)
+    return value, back
+
+
+"""Soft max (sign 1) or soft min (sign -1) of two arrays with the weights of each side"""
+def _softpair(u, v, tau, sign):
+    (su, sv) = (sign * u / tau, sign * v / tau)
+    top = np.fmax(su, sv)
+    top = np.where(np.isfinite(top), top, 0.0)
+    (eu, ev) = (np.exp(su - top), np.exp(sv - top))
+    total = eu + ev
+    # a NaN side (a window cut by the end of the trace) makes a NaN value, its weights are 0 so that a 0 gradient
+    # from above stays 0 instead of 0 * NaN
+    (pu, pv) = (np.nan_to_num(eu / total), np.nan_to_num(ev / total))
+    return sign * tau * (np.log(total) + top), pu, pv
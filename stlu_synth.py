@@ -0,0 +1,227 @@
+import time
+import itertools
+import numpy as np
+from stlu_grammar import *
+from stlu_parametrizer import getParams, getParamsDir, setParams
+from stlu_compiler import compile
+from stlu_trace import Trace
+"""
+File summary
+In this file, we will synthesize the parameters of a template natively instead of through telex. getParamsDir gives for
+every Param the direction that makes the formula harder to satisfy, so satisfaction is monotone along it and each
+parameter can be pushed to its tightest satisfied value by bisection within its Param left;right range.
+"""
+
+
+"""Mine a template on one trace. Same return shape as telex synth.synthSTLParam: (stlsyn, value, dur),
+value is the robustness of the instantiated formula at time 0 and dur the wall time in seconds.
+With a stlu_cache.DiskCache a template already mined on the same trace is not mined again."""
+def synthSTLParam(template, trace, optmethod="analytic", eps=1e-3, cache=None):
+    start = time.time()
+    stl = parse(template) if isinstance(template, str) else template
+    trace = trace if isinstance(trace, Trace) else Trace.fromarray(trace)
+    if cache is not None:
+        names = sorted(p.name for p in getParams(stl))
+        # stored as [value, parameter values in name order]
+        found = cache.fetch(cache.key("synth", stl, trace, optmethod, eps), lambda: synthArray(stl, trace, optmethod, eps, names))
+        valuemap = dict((name, float(v)) for (name, v) in zip(names, found[1:]))
+        return setParams(stl, valuemap), float(found[0]), time.time() - start
+    (valuemap, value) = synthValues(stl, trace, optmethod, eps)
+    return setParams(stl, valuemap), value, time.time() - start
+
+
+def synthArray(stl, trace, optmethod, eps, names):
+    (valuemap, value) = synthValues(stl, trace, optmethod, eps)
+    return np.array([value] + [valuemap[name] for name in names], dtype=float)
+
+
+"""Tight parameter values of a template on one trace and the robustness at time 0 they give"""
+def synthValues(stl, trace, optmethod="analytic", eps=1e-3):
+    evaluator = compile(stl).bind(trace)
+    if optmethod == "analytic":
+        valuemap = analyticParams(stl, evaluator)
+        if valuemap is None:
+            valuemap = bisectParams(stl, evaluator, eps)
+    elif optmethod == "bisect":
+        valuemap = bisectParams(stl, evaluator, eps)
+    else:
+        raise ValueError("Unknown optmethod {}".format(optmethod))
+    return valuemap, robustness(evaluator, valuemap)
+
+
+"""Robustness at time 0, NaN (undefined) never compares as satisfied"""
+def robustness(evaluator, valuemap):
+    return float(evaluator(valuemap)[0])
+
+
+"""Closed form for a template whose single Param is the bound of its only constraint, under a chain of
+G, E and Not, e.g. G[0,95] E[0,23] (x > a? 0;500). Min and max commute with shifting by a constant, so the
+robustness is affine in the parameter: r(a) = r(0) + slope * a with slope -1 or 1. One evaluation at a = 0
+gives the tight value. Returns None when the template does not have this shape."""
+def analyticParams(stl, evaluator):
+    params = getParams(stl)
+    if len(params) != 1:
+        return None
+    p = params[0]
+    slope = affineSlope(stl.subformula if isinstance(stl, Formula) else stl)
+    if slope is None:
+        return None
+    tight = -robustness(evaluator, {p.name: 0.0}) / slope
+    # satisfied on the side where the robustness grows, clip the tight value into the range
+    if slope < 0:
+        return {p.name: float(min(max(tight, float(p.left)), float(p.right)))}
+    return {p.name: float(max(min(tight, float(p.right)), float(p.left)))}
+
+
+"""Slope of the robustness in the constraint bound through a chain of unary operators, None if not affine"""
+def affineSlope(stl):
+    if isinstance(stl, (Globally, Eventually)):
+        if any(isinstance(b, Param) for b in stl.interval):
+            return None
+        return affineSlope(stl.subformula)
+    elif isinstance(stl, Not):
+        slope = affineSlope(stl.subformula)
+        return None if slope is None else -slope
+    elif isinstance(stl, Constraint) and isinstance(stl.bound, Param) and not getParams(stl.term):
+        if stl.relop in (">", ">="):
+            return -1.0
+        elif stl.relop in ("<", "<="):
+            return 1.0
+    return None
+
+
+"""Direction of every parameter: 1 if increasing it strengthens the formula, -1 if decreasing it does.
+A parameter seen with both directions is not monotone."""
+def getMonotoneDirs(stl):
+    dirs = {}
+    for (name, d) in getParamsDir(stl, 0):
+        dirs[name] = d if dirs.get(name, d) == d else 0
+    return dirs
+
+
+"""Names of the parameters used as interval bounds, they move in whole samples"""
+def getIntervalParams(stl):
+    if isinstance(stl, Interval):
+        return set(b.name for b in stl if isinstance(b, Param))
+    elif isinstance(stl, tuple) and not isinstance(stl, (Param, Constant)):
+        return set().union(*[getIntervalParams(child) for child in stl])
+    return set()
+
+
+"""Coordinate-wise bisection. Every parameter starts at its weakest end. Then each one in turn is pushed towards
+its strongest end while the formula stays satisfied (robustness at time 0 >= 0). A formula that is violated
+even at the weakest corner keeps the weakest values."""
+def bisectParams(stl, evaluator, eps=1e-3):
+    params = dict((p.name, p) for p in getParams(stl))
+    dirs = getMonotoneDirs(stl)
+    stepped = getIntervalParams(stl)
+    for name in params:
+        if dirs.get(name, 0) == 0:
+            raise ValueError("Parameter {} has no monotone direction in {}".format(name, stl))
+    weakest = dict((name, float(p.left) if dirs[name] == 1 else float(p.right)) for (name, p) in params.items())
+    collapseIntervals(stl, weakest)
+    valuemap = dict(weakest)
+    if not robustness(evaluator, valuemap) >= 0:
+        return valuemap
+    for name in sorted(params):
+        p = params[name]
+        strongest = float(p.right) if dirs[name] == 1 else float(p.left)
+        valuemap[name] = bisect(lambda v: robustness(evaluator, dict(valuemap, **{name: v})) >= 0,
+                                weakest[name], strongest, 1 if name in stepped else eps)
+    return valuemap
+
+
+"""The weakest corner can invert an interval, e.g. G[a?0;23, b?0;23] starts at [23, 0].
+Such an interval is collapsed to one point by moving its parametric bound (the left one if both are)."""
+def collapseIntervals(stl, valuemap):
+    if isinstance(stl, Interval):
+        (left, right) = [valuemap[b.name] if isinstance(b, Param) else float(b) for b in stl]
+        if left > right:
+            if isinstance(stl.left, Param):
+                valuemap[stl.left.name] = right
+            else:
+                valuemap[stl.right.name] = left
+    elif isinstance(stl, tuple) and not isinstance(stl, (Param, Constant)):
+        for child in stl:
+            collapseIntervals(child, valuemap)
+
+
+"""Tightest value between sat (satisfied) and unsat, with resolution eps (eps 1 keeps integer steps)"""
+def bisect(satisfied, sat, unsat, eps):
+    if satisfied(unsat):
+        return unsat
+    while abs(unsat - sat) > eps:
+        mid = (sat + unsat) / 2.0
+        if eps == 1:
+            mid = np.floor(mid) if unsat > sat else np.ceil(mid)
+            if mid == sat:
+                break
+        if satisfied(mid):
+            sat = mid
+        else:
+            unsat = mid
+    return float(sat)
+
+
+"""Validity domain of a multi-parameter template on one trace. The Param box is split recursively into orthants:
+a box whose strongest corner is satisfied is valid, a box whose weakest corner is violated is invalid (both by
+monotonicity, see getParamsDir), only the boxes in between are split again until they reach the resolution
+(a fraction of every range, whole samples for interval parameters). Satisfaction of every corner is cached, so
+corners shared by neighbouring boxes are evaluated once. Returns the Pareto front: the satisfied valuations
+that no other satisfied valuation beats in every parameter."""
+def paretoFront(template, trace, resolution=1.0 / 64):
+    stl = parse(template) if isinstance(template, str) else template
+    evaluator = compile(stl).bind(trace if isinstance(trace, Trace) else Trace.fromarray(trace))
+    params = sorted(getParams(stl), key=lambda p: p.name)
+    names = [p.name for p in params]
+    dirs = getMonotoneDirs(stl)
+    for name in names:
+        if dirs.get(name, 0) == 0:
+            raise ValueError("Parameter {} has no monotone direction in {}".format(name, stl))
+    stepped = getIntervalParams(stl)
+    eps = [1.0 if p.name in stepped else resolution * (float(p.right) - float(p.left)) for p in params]
+    weakest = tuple(float(p.left) if dirs[p.name] == 1 else float(p.right) for p in params)
+    strongest = tuple(float(p.right) if dirs[p.name] == 1 else float(p.left) for p in params)
+    # strength of a corner: larger is harder to satisfy in every coordinate
+    strength = lambda corner: tuple(dirs[name] * v for (name, v) in zip(names, corner))
+    cache = {}
+
+    def satisfied(corner):
+        if corner not in cache:
+            cache[corner] = robustness(evaluator, dict(zip(names, corner))) >= 0
+        return cache[corner]
+
+    valid = []
+    boxes = [(weakest, strongest)]
+    while boxes:
+        (weak, strong) = boxes.pop()
+        if any(dominates(strength(v), strength(strong)) for v in valid):
+            continue
+        if satisfied(strong):
+            valid.append(strong)
+            continue
+        if not satisfied(weak):
+            continue
+        halves = [splitRange(w, s, e, name in stepped) for (w, s, e, name) in zip(weak, strong, eps, names)]
+        if all(len(h) == 1 for h in halves):
+            valid.append(weak)
+            continue
+        for orthant in itertools.product(*halves):
+            boxes.append((tuple(h[0] for h in orthant), tuple(h[1] for h in orthant)))
+    front = [v for v in set(valid) if not any(dominates(strength(u), strength(v)) and u != v for u in valid)]
+    return [dict(zip(names, v)) for v in sorted(front)]
+
+
+"""u is at least as strong as v in every coordinate"""
+def dominates(u, v):
+    return all(a >= b for (a, b) in zip(u, v))
+
+
+"""Halves of the range from w to s, or the range itself once it is within eps"""
+def splitRange(w, s, eps, stepped):
+    if abs(s - w) <= eps:
+        return [(w, s)]
+    mid = (w + s) / 2.0
+    if stepped:
+        mid = float(np.floor(mid) if s > w else np.ceil(mid))
+    return [(w, mid), (mid, s)]
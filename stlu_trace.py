@@ -0,0 +1,121 @@
+import numpy as np
+from stlu_window import interpolate
+"""
+File summary
+In this file, we will define the Trace: one sorted time array plus one NumPy column per signal, built once and
+shared by every scorer. Windows [t+left, t+right] become searchsorted slices instead of sorting dict keys per call.
+Time stamps can be any increasing numbers. By default a trace is only defined at its samples; with interpolation
+"previous" (sample and hold) or "linear" its signals are defined between samples too, and the scorers then also
+evaluate the two ends of every window.
+"""
+
+interpolations = (None, "previous", "linear")
+
+
+class Trace(object):
+    def __init__(self, signals, time=None, interpolation=None):
+        if interpolation not in interpolations:
+            raise ValueError("Unknown interpolation {}, expected one of {}".format(interpolation, interpolations))
+        self.interpolation = interpolation
+        # arrays of arithmetic terms, filled by stlu_derived
+        self.derived = {}
+        self.signals = dict((name, np.asarray(column)) for name, column in signals.items())
+        lengths = set(len(column) for column in self.signals.values())
+        if len(lengths) > 1:
+            raise ValueError("Signals of a trace must have the same length, got {}".format(sorted(lengths)))
+        if time is None:
+            n = lengths.pop() if lengths else 0
+            time = np.arange(n)
+        self.time = np.asarray(time)
+        if self.signals and len(self.time) != len(next(iter(self.signals.values()))):
+            raise ValueError("Time array has {} samples, signals have {}".format(len(self.time), len(next(iter(self.signals.values())))))
+        steps = np.diff(self.time)
+        if np.any(steps <= 0):
+            raise ValueError("Time stamps of a trace must be strictly increasing")
+        self.shape = next(iter(self.signals.values())).shape if self.signals else self.time.shape
+        self.step = steps[0] if len(steps) else 1
+        self.regular = bool(np.all(steps == self.step))
+
+    """Wrap an array of samples without copying: (T,) is one signal, (T, k) is k signals named by names"""
+    @classmethod
+    def fromarray(cls, array, names=("x",), time=None, interpolation=None):
+        array = np.asarray(array)
+        if array.ndim == 1:
+            array = array[:, None]
+        if array.shape[1] != len(names):
+            raise ValueError("Array has {} columns but {} names were given".format(array.shape[1], len(names)))
+        return cls(dict((name, array[:, i]) for i, name in enumerate(names)), time, interpolation)
+
+    """Wrap a stack of traces without copying: (N, T) is one signal, (N, T, k) is k signals named by names.
+    Columns are (T, N) views so time stays on axis 0 and every operation broadcasts along the batch axis."""
+    @classmethod
+    def frombatch(cls, array, names=("x",), time=None, interpolation=None):
+        array = np.asarray(array)
+        if array.ndim == 2:
+            array = array[:, :, None]
+        if array.shape[2] != len(names):
+            raise ValueError("Array has {} signals but {} names were given".format(array.shape[2], len(names)))
+        return cls(dict((name, array[:, :, i].T) for i, name in enumerate(names)), time, interpolation)
+
+    """Convert the dict traces of stlu_scorer: x['time'] holds the time keys, x[name][t] the values"""
+    @classmethod
+    def fromdict(cls, x, interpolation=None):
+        time = sorted(x['time'].keys())
+        return cls(dict((name, [x[name][t] for t in time]) for name in x if name != 'time'), time, interpolation)
+
+    def __len__(self):
+        return len(self.time)
+
+    def __contains__(self, name):
+        return name in self.signals
+
+    def __getitem__(self, name):
+        return self.signals[name]
+
+    def names(self):
+        return list(self.signals.keys())
+
+    """Index range [lo, hi) of the samples with left <= time <= right"""
+    def span(self, left, right):
+        lo = np.searchsorted(self.time, left, side='left')
+        hi = np.searchsorted(self.time, right, side='right')
+        return lo, hi
+
+    """Time points a scorer evaluates for the window [left, right]: the samples inside it, plus both ends (cut to the
+    trace) when the trace is interpolated"""
+    def window(self, left, right):
+        (lo, hi) = self.span(left, right)
+        inside = self.time[lo:hi]
+        if self.interpolation is None:
+            return inside
+        left = max(left, self.time[0])
+        right = min(right, self.time[-1])
+        if left > right:
+            return inside
+        return np.unique(np.concatenate([[left], inside, [right]]))
+
+    """Index ranges [lo[i], hi[i]) of the window [time[i]+left, time[i]+right] of every sample"""
+    def bounds(self, left, right):
+        lo = np.searchsorted(self.time, self.time + left, side='left')
+        hi = np.searchsorted(self.time, self.time + right, side='right')
+        return lo, hi
+
+    """Integer sample offsets (a, b) of the window [left, right] on a regular trace, None otherwise"""
+    def offsets(self, left, right):
+        if not self.regular:
+            return None
+        a = int(np.ceil(left / self.step - 1e-9))
+        b = int(np.floor(right / self.step + 1e-9))
+        return a, b
+
+    def index(self, t):
+        i = np.searchsorted(self.time, t)
+        if i >= len(self.time) or self.time[i] != t:
+            raise KeyError("No sample at time {}".format(t))
+        return i
+
+    """Value of a signal at time t: a sample, or between samples on an interpolated trace"""
+    def value(self, name, t):
+        if self.interpolation is None or not self.time[0] <= t <= self.time[-1]:
+            return self.signals[name][self.index(t)]
+        return interpolate(self.signals[name], self.time, t, self.interpolation)[()]
@@ -0,0 +1,81 @@
+import numpy as np
+"""
+File summary
+In this file, we will classify [lower, upper] robustness arrays into three-valued verdicts in one NumPy operation and
+summarize them over traces and clients. A verdict is an int8 code, the same classification as quan_to_boo:
+lower >= 0 is a strong satisfaction, lower < 0 <= upper a weak satisfaction, upper < 0 a strong violation and
+anything with NaN (window past the end of the trace) is undefined.
+"""
+
+STRONG_SATISFACTION = 2
+WEAK_SATISFACTION = 1
+STRONG_VIOLATION = 0
+UNDEFINED = -1
+
+VERDICTS = { STRONG_SATISFACTION : "Strong Satisfaction", WEAK_SATISFACTION : "Weak Satisfaction", STRONG_VIOLATION : "Strong Violation", UNDEFINED : "NaN" }
+
+
+"""int8 verdict codes of a (..., 2) robustness array, shape (...)"""
+def verdicts(quan):
+    quan = np.asarray(quan, dtype=float)
+    lower = quan[..., 0]
+    upper = quan[..., 1]
+    with np.errstate(invalid='ignore'):
+        return np.select([lower >= 0, (lower < 0) & (upper >= 0), (lower < 0) & (upper < 0)],
+                         [STRONG_SATISFACTION, WEAK_SATISFACTION, STRONG_VIOLATION], UNDEFINED).astype(np.int8)
+
+
+"""Verdict names of codes, e.g. to print a few of them"""
+def verdict_names(codes):
+    return np.vectorize(VERDICTS.get, otypes=[object])(codes)
+
+
+"""Number of time points of every verdict along the last (time) axis: a dict verdict name -> counts of shape (...)"""
+def verdict_counts(codes):
+    codes = np.asarray(codes)
+    return dict((name, np.count_nonzero(codes == code, axis=-1)) for (code, name) in VERDICTS.items())
+
+
+"""Index of the first time point whose verdict is in violation (-1 if none), along the last axis"""
+def first_violation(codes, violation=(STRONG_VIOLATION,)):
+    mask = np.isin(codes, violation)
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1), -1)
+
+
+"""Longest run of consecutive time points whose verdict is in violation, along the last axis: (length, start),
+start is -1 when there is no such time point"""
+def longest_violation(codes, violation=(STRONG_VIOLATION,)):
+    mask = np.isin(codes, violation)
+    t = np.arange(mask.shape[-1])
+    # length of the run ending at every time point: distance to the last time point outside the run
+    run = t - np.maximum.accumulate(np.where(mask, -1, t), axis=-1)
+    length = run.max(axis=-1, initial=0)
+    start = np.where(length > 0, run.argmax(axis=-1) - length + 1, -1) if mask.shape[-1] else np.full(length.shape, -1)
+    return length, start
+
+
+"""Per-trace report of one (T,) or (N, T) verdict array: one dict per trace with the verdict counts, the first
+violation and the longest violating run (as times if time is given, indices otherwise)"""
+def trace_report(codes, time=None, violation=(STRONG_VIOLATION,)):
+    codes = np.atleast_2d(codes)
+    counts = verdict_counts(codes)
+    first = first_violation(codes, violation)
+    (length, start) = longest_violation(codes, violation)
+    at = (lambda i: i) if time is None else (lambda i: np.asarray(time)[i].item() if i >= 0 else None)
+    return [dict(dict((name, int(counts[name][n])) for name in counts), first_violation=at(int(first[n])),
+                 longest_violation=int(length[n]), longest_violation_start=at(int(start[n])))
+            for n in range(len(codes))]
+
+
+"""Dataset report: data maps client -> (N, T, 2) robustness (or (N, T) verdict codes). Gives for every client the
+per-trace reports and the verdict counts over all of its traces."""
+def dataset_report(data, time=None, violation=(STRONG_VIOLATION,)):
+    report = {}
+    for (client, values) in data.items():
+        values = np.asarray(values)
+        codes = values if values.dtype == np.int8 else verdicts(values)
+        traces = trace_report(codes, time, violation)
+        totals = dict((name, int(count.sum())) for (name, count) in verdict_counts(np.atleast_2d(codes)).items())
+        totals["violating_traces"] = sum(trace["first_violation"] not in (-1, None) for trace in traces)
+        report[client] = dict(traces=traces, totals=totals)
+    return report
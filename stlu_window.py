@@ -0,0 +1,343 @@
+import numpy as np
+from collections import deque
+"""
+File summary
+In this file, we will define the window kernels shared by the monitors: min/max of a signal over
+a window [t+a, t+b] for every time point t at once. Signals are arrays with time on axis 0, any
+trailing axes (lower/upper band, batch, ...) are carried along. Windows are cut at the end of the
+trace, an empty window gives NaN and a NaN inside a window makes the whole window NaN.
+"""
+
+
+"""Full-width window reduction (van Herk / Gil-Werman): out[i] = reduce(y[i : i+w]) for i in 0..len(y)-w.
+Cost is O(len(y)) whatever the width, done in three vectorized passes."""
+def _blockreduce(y, w, ufunc, pad):
+    n = y.shape[0]
+    m = -(-n // w)
+    y = np.concatenate([y, np.full((m * w - n,) + y.shape[1:], pad)])
+    blocks = y.reshape((m, w) + y.shape[1:])
+    g = ufunc.accumulate(blocks, axis=1).reshape(y.shape)
+    h = np.flip(ufunc.accumulate(np.flip(blocks, axis=1), axis=1), axis=1).reshape(y.shape)
+    return ufunc(h[:n - w + 1], g[w - 1:n])
+
+
+def _sliding(x, a, b, ufunc, pad):
+    x = np.asarray(x, dtype=float)
+    n = x.shape[0]
+    a = int(a)
+    b = int(b)
+    if a > b:
+        raise ValueError("Interval [{},{}] empty".format(a, b))
+    out = np.full(x.shape, np.nan)
+    first = max(0, -b)
+    last = min(n, n - a)
+    if first >= last:
+        return out
+    w = b - a + 1
+    front = max(0, -a)
+    y = np.concatenate([np.full((front,) + x.shape[1:], pad), x, np.full((w - 1,) + x.shape[1:], pad)])
+    full = _blockreduce(y, w, ufunc, pad)
+    out[first:last] = full[first + a + front:last + a + front]
+    return out
+
+
+"""Sliding minimum: out[t] = min(x[t+a], ..., x[t+b]) with integer offsets a <= b"""
+def slidingmin(x, a, b):
+    return _sliding(x, a, b, np.minimum, np.inf)
+
+
+"""Sliding maximum: out[t] = max(x[t+a], ..., x[t+b]) with integer offsets a <= b"""
+def slidingmax(x, a, b):
+    return _sliding(x, a, b, np.maximum, -np.inf)
+
+
+"""Streaming window reduction (Lemire monotone deque) for one column.
+lo and hi must be non-decreasing, the window of t is x[lo[t]:hi[t]]. Each index enters and leaves the deque once."""
+def _dequereduce(x, lo, hi, better):
+    out = np.full(len(lo), np.nan)
+    window = deque()
+    j = 0
+    for t in range(len(lo)):
+        while j < hi[t]:
+            while window and not better(x[window[-1]], x[j]):
+                window.pop()
+            window.append(j)
+            j += 1
+        while window and window[0] < lo[t]:
+            window.popleft()
+        if window:
+            out[t] = x[window[0]]
+    return out
+
+
+def _window(x, lo, hi, better, pad):
+    x = np.asarray(x, dtype=float)
+    lo = np.asarray(lo, dtype=int)
+    hi = np.asarray(hi, dtype=int)
+    flat = x.reshape(x.shape[0], -1)
+    out = np.empty((len(lo), flat.shape[1]))
+    # a window touching a NaN is NaN, the deque itself only ever sees numbers
+    nans = np.concatenate([np.zeros((1, flat.shape[1]), dtype=int), np.cumsum(np.isnan(flat), axis=0)])
+    clean = np.where(np.isnan(flat), pad, flat)
+    for c in range(flat.shape[1]):
+        out[:, c] = _dequereduce(clean[:, c].tolist(), lo, hi, better)
+    out[(nans[hi] - nans[lo]) > 0] = np.nan
+    return out.reshape((len(lo),) + x.shape[1:])
+
+
+"""Window minimum over arbitrary monotone windows: out[t] = min(x[lo[t]:hi[t]])"""
+def windowmin(x, lo, hi):
+    return _window(x, lo, hi, lambda u, v: u < v, np.inf)
+
+
+"""Window maximum over arbitrary monotone windows: out[t] = max(x[lo[t]:hi[t]])"""
+def windowmax(x, lo, hi):
+    return _window(x, lo, hi, lambda u, v: u > v, -np.inf)
+
+
+"""Window bounds of integer offsets [a, b] over a trace of n samples, cut at both ends"""
+def offsetbounds(n, a, b):
+    t = np.arange(n)
+    return np.clip(t + int(a), 0, n), np.clip(t + int(b) + 1, 0, n)
+
+
+"""Backward until pass for one column (robust until in O(T) amortized).
+out[t] = max over j in [lo[t], hi[t]) of min(r[j], min(l[lo[t]..j])). Going backwards in t the window start moves left,
+every new start l[s] caps all running values at once, so only the capped prefix of the monotone deque needs touching."""
+def _dequeuntil(l, r, lo, hi):
+    n = len(lo)
+    out = np.full(n, np.nan)
+    window = deque()
+    s = len(l)
+    for t in range(n - 1, -1, -1):
+        while s > lo[t]:
+            s -= 1
+            cap = l[s]
+            kept = None
+            while window and window[0][1] >= cap:
+                kept = window.popleft()[0]
+            if kept is not None:
+                window.appendleft((kept, cap))
+            c = min(r[s], cap)
+            while window and window[-1][1] <= c:
+                window.pop()
+            window.append((s, c))
+        while window and window[0][0] >= hi[t]:
+            window.popleft()
+        if window and lo[t] < hi[t]:
+            out[t] = window[0][1]
+    return out
+
+
+# widest window for which until steps through the window offsets, wider windows go through the O(T) deque one
+# column at a time. The steps run on tiles of about _tilecells cells that stay in cache, about 2 ns a cell and
+# step, against about 2 us a cell for the deque
+_offsetwidth = 1024
+_tilecells = 1 << 14
+
+
+"""Until by window offsets, all columns at once: step k extends every window by one sample, so after the widest
+window out[t] = max_j min(r[j], min(l[lo[t]..j])). Samples outside a window read padding (l = +inf, r = -inf) that
+changes nothing. With the offsets (a, b) of a regular window step k reads the slice of samples t+a+k, otherwise
+it gathers the samples lo[t]+k. O(width) vectorized passes over each tile of rows, the samples a tile reads in
+one step are mostly the ones it read in the step before, so they come from cache."""
+def _offsetuntil(l, r, lo, hi, offsets=None):
+    n = len(l)
+    columns = l.shape[1]
+    out = np.empty((len(lo), columns))
+    if offsets is None:
+        l = np.concatenate([l, np.full((1, columns), np.inf)])
+        r = np.concatenate([r, np.full((1, columns), -np.inf)])
+    else:
+        (a, b) = offsets
+        front = max(0, -a)
+        back = max(0, b)
+        l = np.concatenate([np.full((front, columns), np.inf), l, np.full((back, columns), np.inf)])
+        r = np.concatenate([np.full((front, columns), -np.inf), r, np.full((back, columns), -np.inf)])
+    rows = max(1, _tilecells // columns)
+    for t0 in range(0, len(lo), rows):
+        t1 = min(t0 + rows, len(lo))
+        best = np.full((t1 - t0, columns), -np.inf)
+        running = np.full((t1 - t0, columns), np.inf)
+        candidate = np.empty_like(best)
+        if offsets is None:
+            (start, stop) = (lo[t0:t1], hi[t0:t1])
+            steps = [np.where(start + k < stop, start + k, n) for k in range(int(np.max(stop - start)))]
+        else:
+            steps = [slice(a + k + front + t0, a + k + front + t1) for k in range(b - a + 1)]
+        for j in steps:
+            np.minimum(running, l[j], out=running)
+            np.minimum(r[j], running, out=candidate)
+            np.maximum(best, candidate, out=best)
+        out[t0:t1] = best
+    out[lo >= hi] = np.nan
+    return out
+
+
+"""Until over arbitrary monotone windows: out[t] = max_{j in [lo[t], hi[t])} min(r[j], min(l[lo[t]:j+1])).
+Windows up to _offsetwidth samples are stepped through on all columns at once (offsets: the (a, b) of windows
+lo = t+a, hi = t+b+1 cut to the trace, read as slices), wider ones use the deque column by column."""
+def untilwindow(l, r, lo, hi, offsets=None):
+    l = np.asarray(l, dtype=float)
+    r = np.asarray(r, dtype=float)
+    lo = np.asarray(lo, dtype=int)
+    hi = np.asarray(hi, dtype=int)
+    flatl = l.reshape(l.shape[0], -1)
+    flatr = r.reshape(r.shape[0], -1)
+    out = np.empty((len(lo), flatl.shape[1]))
+    bad = np.isnan(flatl) | np.isnan(flatr)
+    nans = np.concatenate([np.zeros((1, flatl.shape[1]), dtype=int), np.cumsum(bad, axis=0)])
+    flatl = np.where(bad, 0.0, flatl)
+    flatr = np.where(bad, 0.0, flatr)
+    if offsets is not None and offsets[1] - offsets[0] + 1 > _offsetwidth:
+        offsets = None
+    if len(lo) and np.max(hi - lo) <= _offsetwidth:
+        out = _offsetuntil(flatl, flatr, lo, hi, offsets)
+    else:
+        for c in range(flatl.shape[1]):
+            out[:, c] = _dequeuntil(flatl[:, c].tolist(), flatr[:, c].tolist(), lo, hi)
+    out[(nans[hi] - nans[lo]) > 0] = np.nan
+    return out.reshape((len(lo),) + l.shape[1:])
+
+
+"""Until with integer offsets [a, b]: the window of t is t+a .. t+b, cut at the end of the trace"""
+def slidinguntil(l, r, a, b):
+    if a > b:
+        raise ValueError("Interval [{},{}] empty".format(a, b))
+    lo, hi = offsetbounds(len(l), a, b)
+    return untilwindow(l, r, lo, hi, (int(a), int(b)))
+
+
+"""Until over one window given as sequences: max_j min(r[j], min(l[0..j])). Works on numbers and on booleans."""
+def untilvalue(l, r):
+    best = None
+    running = None
+    for lj, rj in zip(l, r):
+        running = lj if running is None else min(running, lj)
+        value = min(rj, running)
+        best = value if best is None else max(best, value)
+    if best is None:
+        raise ValueError("Until over an empty window")
+    return best
+
+
+"""Sparse table over one signal: after an O(T log T) build, the min or max of any window x[lo:hi] is two lookups.
+Used when the same child signal is queried under many different windows, e.g. while sweeping interval parameters."""
+class RangeIndex(object):
+    def __init__(self, x):
+        x = np.asarray(x, dtype=float)
+        self.n = x.shape[0]
+        mins = [x]
+        maxs = [x]
+        k = 1
+        while 2 * k <= self.n:
+            mins.append(np.minimum(mins[-1][:-k], mins[-1][k:]))
+            maxs.append(np.maximum(maxs[-1][:-k], maxs[-1][k:]))
+            k *= 2
+        # level j holds the reduction of x[i : i + 2**j], padded to the full length
+        self.mins = np.stack([np.concatenate([m, np.full((self.n - len(m),) + x.shape[1:], np.nan)]) for m in mins])
+        self.maxs = np.stack([np.concatenate([m, np.full((self.n - len(m),) + x.shape[1:], np.nan)]) for m in maxs])
+
+    def _query(self, table, ufunc, lo, hi):
+        lo = np.asarray(lo, dtype=int)
+        hi = np.asarray(hi, dtype=int)
+        width = hi - lo
+        empty = width <= 0
+        level = np.floor(np.log2(np.where(empty, 1, width))).astype(int)
+        lo = np.where(empty, 0, lo)
+        last = np.where(empty, 0, hi - (1 << level))
+        out = ufunc(table[level, lo], table[level, last])
+        out[empty] = np.nan
+        return out
+
+    """out[t] = min(x[lo[t]:hi[t]]), NaN for an empty window"""
+    def min(self, lo, hi):
+        return self._query(self.mins, np.minimum, lo, hi)
+
+    """out[t] = max(x[lo[t]:hi[t]]), NaN for an empty window"""
+    def max(self, lo, hi):
+        return self._query(self.maxs, np.maximum, lo, hi)
+
+
+"""Index ranges [lo[t], hi[t]) of the samples with time[t]+left <= time <= time[t]+right, time increasing (any spacing)"""
+def timebounds(time, left, right):
+    time = np.asarray(time, dtype=float)
+    return np.searchsorted(time, time + left, side='left'), np.searchsorted(time, time + right, side='right')
+
+
+"""Values of the signal x (time on axis 0) at the times at, between the samples: "previous" holds the last sample,
+"linear" joins consecutive samples by a line. Times outside the trace take the value of the nearest end."""
+def interpolate(x, time, at, interpolation="previous"):
+    x = np.asarray(x, dtype=float)
+    time = np.asarray(time, dtype=float)
+    at = np.asarray(at, dtype=float)
+    n = len(time)
+    i = np.clip(np.searchsorted(time, at, side='right') - 1, 0, n - 1)
+    if interpolation == "previous":
+        return x[i]
+    elif interpolation != "linear":
+        raise ValueError("Unknown interpolation {}".format(interpolation))
+    j = np.minimum(i + 1, n - 1)
+    step = time[j] - time[i]
+    w = np.clip(np.where(step > 0, (at - time[i]) / np.where(step > 0, step, 1), 0), 0, 1)
+    w = w.reshape(w.shape + (1,) * (x.ndim - 1))
+    with np.errstate(invalid='ignore'):
+        # w == 0 keeps the sample itself, also when the next one is infinite
+        return np.where(w == 0, x[i], x[i] + w * (x[j] - x[i]))
+
+
+"""Window endpoints of every time point, cut to the trace, and the mask of the windows that overlap the trace"""
+def _endpoints(time, left, right):
+    start = np.maximum(time + left, time[0])
+    end = np.minimum(time + right, time[-1])
+    return start, end, start <= end
+
+
+def _columns(mask, x):
+    return mask.reshape(mask.shape + (1,) * (np.ndim(x) - 1))
+
+
+"""Window minimum or maximum (kind "min" / "max") over [time[t]+left, time[t]+right] for every sample t of a trace
+with arbitrary increasing times. Without interpolation the window holds the samples inside it and an empty window
+gives NaN. With interpolation ("previous" / "linear") x is a signal over continuous time: the window also holds its
+values at both ends (cut to the trace), which is exact for one signal since a piecewise constant or linear function
+takes its extrema at samples or ends; only a window entirely outside the trace gives NaN."""
+def timedwindow(x, time, left, right, kind="min", interpolation=None):
+    x = np.asarray(x, dtype=float)
+    time = np.asarray(time, dtype=float)
+    if left > right:
+        raise ValueError("Interval [{},{}] empty".format(left, right))
+    (lo, hi) = timebounds(time, left, right)
+    out = (windowmin if kind == "min" else windowmax)(x, lo, hi)
+    if interpolation is None:
+        return out
+    ufunc = np.minimum if kind == "min" else np.maximum
+    (start, end, inside) = _endpoints(time, left, right)
+    out = np.where(_columns(lo < hi, x), out, np.inf if kind == "min" else -np.inf)
+    out = ufunc(out, ufunc(interpolate(x, time, start, interpolation), interpolate(x, time, end, interpolation)))
+    return np.where(_columns(inside, x), out, np.nan)
+
+
+"""Until window over [time[t]+left, time[t]+right] for a trace with arbitrary increasing times:
+max over j in the window of min(r[j], min of l from the start of the window to j). With interpolation the start and
+end of the window are taken as the first and last points of the sequence, with the interpolated values of l and r."""
+def timeduntil(l, r, time, left, right, interpolation=None):
+    l = np.asarray(l, dtype=float)
+    r = np.asarray(r, dtype=float)
+    time = np.asarray(time, dtype=float)
+    if left > right:
+        raise ValueError("Interval [{},{}] empty".format(left, right))
+    (lo, hi) = timebounds(time, left, right)
+    window = untilwindow(l, r, lo, hi)
+    if interpolation is None:
+        return window
+    (start, end, inside) = _endpoints(time, left, right)
+    nonempty = _columns(lo < hi, l)
+    window = np.where(nonempty, window, -np.inf)
+    lowest = np.where(nonempty, windowmin(l, lo, hi), np.inf)
+    (ls, rs) = (interpolate(l, time, start, interpolation), interpolate(r, time, start, interpolation))
+    (le, re) = (interpolate(l, time, end, interpolation), interpolate(r, time, end, interpolation))
+    # the start of the window caps every running minimum of l
+    out = np.maximum(np.minimum(rs, ls), np.minimum(ls, window))
+    out = np.maximum(out, np.minimum(np.minimum(re, le), np.minimum(ls, lowest)))
+    return np.where(_columns(inside, l), out, np.nan)
@@ -0,0 +1,23 @@
+import numpy as np
+from stlu_benchmark import benchmark, runner, random_trace, engines
+
+
+def test_every_engine_scores_the_whole_trace():
+    (trace, omega) = random_trace(30)
+    text = "s, G[0,4]((x > 0))"
+    for engine in engines[2:]:
+        assert len(runner(engine, text, trace, omega, 0.95)()) == (26 if engine == "umonitor" else 30)
+
+
+"""umonitor at every t of its horizon agrees with umonitor_signal"""
+def test_umonitor_loop_matches_umonitor_signal():
+    (trace, omega) = random_trace(30)
+    text = "s, G[0,4](U[1,3]((x > 0), (x > 1)))"
+    pointwise = np.array(runner("umonitor", text, trace, omega, 0.95)())
+    signal = runner("umonitor_signal", text, trace, omega, 0.95)()
+    np.testing.assert_allclose(pointwise, signal[:len(pointwise)])
+
+
+def test_grid_runs_without_errors():
+    rows = benchmark(lengths=(40,), widths=(3,), depths=(1, 2), formulas=2, repeat=1)
+    assert [row for row in rows if "error" in row] == []
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import pytest
+from stlu_grammar import parse
+from stlu_compiler import compile
+from stlu_trace import Trace
+from stlu_cache import DiskCache
+
+
+def test_hit_and_miss_return_the_same_kind_of_array(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    plan = compile(parse("s, G[0,3]((x > 1))"))
+    x = Trace.fromarray(np.arange(10.0))
+    miss = plan(x, cache=cache)
+    hit = plan(x, cache=cache)
+    assert type(miss) is type(hit) is np.ndarray
+    assert not miss.flags.writeable and not hit.flags.writeable
+    np.testing.assert_array_equal(miss, hit)
+    with pytest.raises(ValueError):
+        miss[0] = 0
+
+
+def test_computed_array_stays_writable(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    computed = np.arange(4.0)
+    cache.fetch("k" * 64, lambda: computed)
+    computed[0] = 1.0
+
+
+def test_eviction_keeps_recent_entries_within_budget(tmp_path):
+    entry = np.zeros(100)
+    cache = DiskCache(str(tmp_path), budget=10 * 928)
+    keys = ["{:064x}".format(i) for i in range(30)]
+    for key in keys[:10]:
+        cache.put(key, entry)
+    assert cache.get(keys[0]) is not None
+    for key in keys[10:]:
+        cache.put(key, entry)
+        assert cache.size <= cache.budget
+    assert cache.get(keys[0]) is None and cache.get(keys[-1]) is not None
+    assert cache.size == sum(os.path.getsize(path) for path in cache._entries())
+    # reopened, the entries and their order come from the disk
+    reopened = DiskCache(str(tmp_path), budget=cache.budget)
+    assert list(reopened.index) == [path for path in cache.index]
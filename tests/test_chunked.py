@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from stlu_grammar import parse
+from stlu_compiler import compile
+from stlu_trace import Trace
+from stlu_benchmark import to_requirement
+from stlu_node_robustness import umonitor_signal
+from stlu_chunked import score_chunked, umonitor_chunked, horizon
+
+FORMULAS = [
+    "s, G[0,5]((x > 0))",
+    "s, (E[2,7]((x > 1)) & !(G[0,3]((x < 0))))",
+    "s, U[1,4]((x > 0), (x > 1))",
+    "s, G[0,3](U[0,6]((x > 0), E[1,2]((x > 1))))",
+]
+
+
+@pytest.mark.parametrize("text", FORMULAS)
+@pytest.mark.parametrize("chunksize", [1, 7, 50])
+def test_score_chunked_is_bit_identical(text, chunksize):
+    x = np.cumsum(np.random.RandomState(0).normal(0, 0.5, 200))
+    stl = parse(text)
+    whole = compile(stl)(Trace.fromarray(x))
+    assert np.array_equal(score_chunked(stl, x, chunksize=chunksize), whole, equal_nan=True)
+    with ThreadPoolExecutor(2) as pool:
+        assert np.array_equal(score_chunked(stl, x, chunksize=chunksize, executor=pool), whole, equal_nan=True)
+
+
+@pytest.mark.parametrize("text", FORMULAS)
+@pytest.mark.parametrize("chunksize", [1, 7, 50])
+def test_umonitor_chunked_is_bit_identical(text, chunksize):
+    rng = np.random.RandomState(1)
+    omega = np.stack([np.cumsum(rng.normal(0, 0.5, 200)), np.abs(rng.normal(0, 0.2, 200))], axis=1)
+    requirement = to_requirement(parse(text), omega, 0.95)
+    assert np.array_equal(umonitor_chunked(requirement, chunksize=chunksize), umonitor_signal(requirement), equal_nan=True)
+
+
+def test_horizon():
+    assert horizon(parse("s, G[0,3](U[0,6]((x > 0), E[1,2]((x > 1))))")) == 11
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from stlu_grammar import parse
+from stlu_compiler import compile
+from stlu_trace import Trace
+
+
+@pytest.mark.parametrize("template", [
+    "s, G[0,10]((x < c?0;10))",
+    "s, (G[a?0;5, b?5;12]((x > 2)) & E[0,3]((x < c?0;10)))",
+    "s, E[0, b?0;12](U[0,3]((x > 1), (x > c?0;10)))",
+    "s, (G[0, b?0;12]((x > 2)) | !(E[a?0;5, 6]((x < 3))))",
+])
+def test_bound_plan_matches_plan(template):
+    plan = compile(parse(template))
+    rng = np.random.RandomState(0)
+    trace = Trace.fromarray(rng.uniform(0, 10, 40))
+    # a small memo, so valuations come back both from the memo and after eviction
+    bound = plan.bind(trace, cachesize=2)
+    names = sorted(plan.params)
+    valuations = [dict((name, float(rng.randint(0, 13))) for name in names) for k in range(30)]
+    for valuemap in valuations + valuations[::-1]:
+        assert np.array_equal(bound(valuemap), plan(trace, valuemap), equal_nan=True)
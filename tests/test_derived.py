@@ -0,0 +1,35 @@
+import numpy as np
+from stlu_grammar import parse, Var, Constant
+from stlu_trace import Trace
+from stlu_compiler import compile
+from stlu_scorer import getval
+from stlu_derived import derived, termkey
+
+
+def trace():
+    rng = np.random.RandomState(0)
+    return Trace({"x": rng.uniform(1, 3, 20), "y": rng.uniform(1, 3, 20)})
+
+
+def test_derived_matches_getval():
+    x = trace()
+    for text in ["s, ({x - y} > 1)", "s, ({{x * 2} / y} > 1)", "s, ({{x + 1} - {y * x}} < 0)"]:
+        term = parse(text).subformula.term
+        values = derived(term, x)
+        np.testing.assert_allclose(values, [getval(term, x, t) for t in x.time])
+
+
+def test_terms_are_shared():
+    x = trace()
+    left = parse("s, ({x - y} > 1)").subformula.term
+    right = parse("s, G[0,3](({x - y} < 2))").subformula.subformula.term
+    assert derived(left, x) is derived(right, x)
+    assert list(x.derived) == [termkey(left)]
+    # plans read the array kept on the trace instead of computing their own
+    x.derived[termkey(left)] = np.full(20, 5.0)
+    np.testing.assert_array_equal(compile(parse("s, ({x - y} > 1)"))(x), np.full(20, 4.0))
+
+
+def test_numbers_and_constants_are_different_keys():
+    assert termkey(Var("3")) != termkey(Constant(3))
+    assert derived(Var("3"), trace()) == derived(Constant(3), trace()) == 3.0
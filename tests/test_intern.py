@@ -0,0 +1,19 @@
+import stlu_grammar
+from stlu_grammar import parse, intern, clear_interned
+
+
+def test_intern_shares_nodes():
+    clear_interned()
+    a = intern(parse("w, G[0,95] E[0,23] (x > a? 0;500)"))
+    b = intern(parse("w, G[0,95] E[0,23] (x > a? 0;500)"))
+    assert a is b
+
+
+def test_intern_table_is_bounded(monkeypatch):
+    clear_interned()
+    monkeypatch.setattr(stlu_grammar, "_internsize", 64)
+    for i in range(500):
+        stl = parse("s, G[0,{}] (x > {})".format(i, i))
+        assert repr(intern(stl)) == repr(stl)
+    assert len(stlu_grammar._interned) <= 64
+    clear_interned()
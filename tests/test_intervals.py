@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from stlu_grammar import parse, stl_generator
+from stlu_trace import Trace
+from stlu_scorer import qualitativescore
+from stlu_intervals import satisfaction, tomask, frommask, tobits, frombits, union, intersection, complement
+
+OPS = {"G": 1, "E": 1, "U": 1, "&": 1, "|": 1, "->": 1, "!": 1}
+
+
+def corpus(n, depth):
+    return [stl_generator(depth, seed="intervals-{}-{}".format(depth, i), ops=OPS, width=(0, 4), start=(0, 2),
+                          values=(0, 1), relops=(">", "<", ">=", "<=")) for i in range(n)]
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3])
+@pytest.mark.parametrize("regular", [True, False])
+def test_satisfaction_matches_qualitativescore(depth, regular):
+    rng = np.random.RandomState(depth)
+    x = np.cumsum(rng.normal(0, 0.5, 40))
+    time = np.arange(40.0) if regular else np.cumsum(rng.choice([0.5, 1.0, 2.0], 40))
+    trace = Trace({"x": x}, time)
+    for text in corpus(10, depth):
+        stl = parse(text)
+        mask = tomask(satisfaction(stl, trace), len(trace))
+        expected = [bool(qualitativescore(stl, trace, t)) for t in trace.time]
+        assert mask.tolist() == expected, text
+
+
+def test_set_algebra_matches_masks():
+    rng = np.random.RandomState(0)
+    for k in range(50):
+        (a, b) = (rng.rand(30) < 0.5, rng.rand(30) < 0.3)
+        (sa, sb) = (frommask(a), frommask(b))
+        assert tomask(union(sa, sb), 30).tolist() == (a | b).tolist()
+        assert tomask(intersection(sa, sb, 30), 30).tolist() == (a & b).tolist()
+        assert tomask(complement(sa, 30), 30).tolist() == (~a).tolist()
+        assert np.array_equal(frombits(tobits(sa, 30), 30), sa)
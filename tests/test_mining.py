@@ -0,0 +1,38 @@
+import numpy as np
+from stlu_mining import mineDataset, loadResults
+
+TEMPLATES = {"upper": "s, G[0, 5]((x < c?0;10))", "lower": "s, E[0, b?0;10]((x > 2))"}
+
+
+def dataset():
+    rng = np.random.RandomState(0)
+    # a list client is copied into its block the same way as an array client
+    return {"a": rng.uniform(0, 4, (3, 20)), "b": rng.uniform(0, 4, (2, 20)).tolist()}
+
+
+def formulas(path):
+    return dict((key, record.get("formula", record.get("error"))) for (key, record) in loadResults(str(path)).items())
+
+
+def test_pool_matches_serial(tmp_path):
+    serial = mineDataset(dataset(), TEMPLATES, str(tmp_path / "serial.jsonl"), workers=0)
+    pooled = mineDataset(dataset(), TEMPLATES, str(tmp_path / "pool.jsonl"), workers=2)
+    assert serial["mined"] == pooled["mined"] == 10
+    assert serial["failed"] == pooled["failed"] == 0
+    assert formulas(tmp_path / "serial.jsonl") == formulas(tmp_path / "pool.jsonl")
+
+
+
+"""A task mines every template of its trace, the templates share one Trace and its derived terms"""
+def test_templates_of_a_trace_share_the_trace(monkeypatch):
+    import stlu_mining
+    seen = []
+    synth = stlu_mining.synthSTLParam
+    monkeypatch.setattr(stlu_mining, "synthSTLParam", lambda template, trace, optmethod: seen.append(trace) or synth(template, trace, optmethod))
+    monkeypatch.setitem(stlu_mining._views, 0, dataset()["a"])
+    try:
+        records = stlu_mining._mineTrace(0, 1, list(TEMPLATES.items()), ("x",), "analytic")
+    finally:
+        stlu_mining._traces.clear()
+    assert [record["template"] for record in records] == ["upper", "lower"]
+    assert len(seen) == 2 and seen[0] is seen[1]
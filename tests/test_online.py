@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from stlu_grammar import parse
+from stlu_online import OnlineMonitor
+from stlu_benchmark import to_requirement
+from stlu_node_robustness import umonitor_signal
+
+
+def omega(seed, length=80):
+    rng = np.random.RandomState(seed)
+    return np.stack([rng.randn(length), np.abs(rng.randn(length)) * 0.2], axis=1)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("text", [
+    "s, U[0,5]((x > 0), (x > 1))",
+    "s, U[2,7]((x > 0), (x > 1))",
+    "s, U[0,40]((x > 0), (x > 1))",
+    "s, G[0,3](U[1,4]((x > 0), (x > 1)))",
+    "s, (E[1,3](x > 1) & !U[0,2]((x > 0), (x < 0)))",
+    "s, (G[0,4](x > 0) | E[2,6](x < 1))",
+])
+def test_online_matches_umonitor_signal(text, seed):
+    stl = parse(text)
+    samples = omega(seed)
+    monitor = OnlineMonitor(stl)
+    out = monitor.extend(samples)
+    reference = umonitor_signal(to_requirement(stl, samples, 0.95))
+    assert [t for (t, value) in out] == list(range(len(samples) - monitor.horizon))
+    np.testing.assert_allclose(np.array([value for (t, value) in out]), reference[:len(out)])
+
+
+"""Samples come one at a time or in chunks, the finalized bands are the same"""
+def test_push_and_extend_agree():
+    samples = omega(5)
+    stl = parse("s, (G[0,3](x > 0) -> U[1,4]((x > 0), (x > 1)))")
+    pushed = OnlineMonitor(stl)
+    out = []
+    for sample in samples:
+        out.extend(pushed.push(sample))
+    assert out == OnlineMonitor(stl).extend(samples)
+    assert len(out) == len(samples) - pushed.horizon
+
+
+"""Two signals come as a dict per sample"""
+def test_two_signals():
+    (x, y) = (omega(1), omega(2))
+    stl = parse("s, G[0,3]((x > y))")
+    out = OnlineMonitor(stl, cl=0.9).extend([{"x": tuple(a), "y": tuple(b)} for (a, b) in zip(x, y)])
+    z = 1.6448536269514722
+    margin = np.stack([x[:, 0] - y[:, 0] - z * (x[:, 1] + y[:, 1]), x[:, 0] - y[:, 0] + z * (x[:, 1] + y[:, 1])], axis=1)
+    reference = np.stack([[margin[t:t + 4, k].min() for k in (0, 1)] for t in range(len(out))])
+    np.testing.assert_allclose(np.array([value for (t, value) in out]), reference)
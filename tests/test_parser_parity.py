@@ -0,0 +1,51 @@
+import pytest
+from stlu_grammar import parse, parse_parity, stl_corpus, stl_generator
+
+# the templates of data_property_observations.ipynb as written there (telex syntax, rejected by both parsers)
+NOTEBOOK = [
+    'G[0,95] F[0,23] (x>a? 0;500)',
+    'F[0,95] G[0, a?0;23] (x>50)',
+    'F[0,95] (F[0,23]x>a? 0;500 | F[0,23]x<a? 0;50)',
+    'F[0,95] (F[0,23] (x>50) & G[a?0;23, b?0;23] (x>50))',
+    'G[0,95] (x<500 -> F[0, a?0;23] (x>50))',
+]
+
+# and in the grammar of this repository
+TEMPLATES = [
+    'w, G[0,95] E[0,23] (x > a? 0;500)',
+    'w, E[0,95] G[0, a?0;23] (x > 50)',
+    'w, E[0,95] (E[0,23] (x > a? 0;500) | E[0,23] (x < a? 0;50))',
+    'w, E[0,95] (E[0,23] (x > 50) & G[a?0;23, b?0;23] (x > 50))',
+    'w, G[0,95] ((x < 500) -> E[0, a?0;23] (x > 50))',
+]
+
+OPS = {"G": 1, "E": 1, "U": 1, "&": 1, "|": 1, "->": 1, "!": 1}
+
+
+def check(formulas):
+    mismatches = parse_parity(formulas)
+    assert mismatches == [], mismatches[:3]
+
+
+def test_notebook_templates():
+    for template in TEMPLATES:
+        parse(template)
+    check(NOTEBOOK + TEMPLATES)
+
+
+def test_corpus():
+    check(stl_corpus(300, seed=0))
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_generator(depth):
+    check([stl_generator(depth, seed=i, ops=OPS, signals=2) for i in range(100)])
+
+
+"""Formulas the parsers should both reject or both accept: truncations and whitespace changes of valid ones"""
+def test_mutations():
+    formulas = stl_corpus(40, seed=1) + TEMPLATES
+    mutated = []
+    for f in formulas:
+        mutated += [f[:len(f) // 2], f.replace(" ", ""), f.replace(" ", "  "), f + ")", "(" + f]
+    check(mutated)
@@ -0,0 +1,27 @@
+import numpy as np
+import stlu_node_robustness
+from stlu_grammar import parse
+from stlu_scorer import quantitativescore
+from stlu_trace import Trace
+from stlu_profile import Profiler
+
+
+"""Formulas dropped during profiling must not hand their id over to a later formula"""
+def test_records_keep_their_node():
+    x = Trace.fromarray(np.arange(10.0))
+    with Profiler(engines=("quantitativescore",)) as prof:
+        for i in range(100):
+            quantitativescore(parse("s, (x > {})".format(i)), x, 0)
+    labels = [record.label for record in prof.records.values() if record.label.startswith("(x >")]
+    assert len(labels) == 100
+    assert all(record.node is not None for record in prof.records.values())
+
+
+def test_window_is_the_span_for_formulas_and_requirements():
+    x = Trace.fromarray(np.arange(10.0))
+    with Profiler(engines=("quantitativescore", "umonitor_signal")) as prof:
+        quantitativescore(parse("s, G[0,5](x > 1)"), x, 0)
+        stlu_node_robustness.umonitor_signal((("always", (0, 5)), ((("mu", np.stack([np.arange(10.0), np.ones(10)], 1)), (1.0, 0.9)))))
+    assert [record.samples for record in prof.records.values() if record.engine == "umonitor_signal"] == [10, 10]
+    windows = [record.window for record in prof.records.values() if record.window is not None]
+    assert windows == [5.0, 5]
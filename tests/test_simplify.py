@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from stlu_grammar import parse
+from stlu_compiler import compile
+from stlu_trace import Trace
+from stlu_simplify import simplify
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("s, ((1 > 0) & (x > 2))", "s, (x > 2)"),
+    ("s, ((x > 2) | (1 < 0))", "s, (x > 2)"),
+    ("s, (({1 + 2} > 4) | (x > 2))", "s, (x > 2)"),
+    ("s, ((x > 2) & !(2 == 3))", "s, (x > 2)"),
+    ("s, ((x > 2) & (3 > 4))", "s, ((1 < 0))"),
+    ("s, (G[0,3](x > 1) | !(1 < 0))", "s, ((1 > 0))"),
+    ("s, (!(1 > 0) -> (x > 2))", "s, ((1 > 0))"),
+])
+def test_constant_constraints_are_absorbed(text, expected):
+    assert simplify(parse(text)) == simplify(parse(expected))
+
+
+"""A constant with a zero margin holds with robustness 0 and is not folded: folding it to true or false would flip
+the sign of the robustness"""
+@pytest.mark.parametrize("text", ["s, ((x > 2) | (3 < 3))", "s, ((x > 2) & (3 > 3))", "s, ((x > 2) & !(2 == 2))"])
+def test_zero_margin_constants_keep_the_robustness(text):
+    x = Trace.fromarray(np.random.RandomState(0).uniform(0, 4, 20))
+    np.testing.assert_array_equal(compile(simplify(parse(text)))(x), compile(parse(text))(x))
+
+
+"""Absorbing a constant changes the robustness only through the margin of the constant: the simplified formula
+scores like the formula written without it and has the sign of the original"""
+@pytest.mark.parametrize("text, without", [
+    ("s, (((1 > 0) & (x > 2)) | G[0,3](x < 1))", "s, ((x > 2) | G[0,3](x < 1))"),
+    ("s, (E[0,2](x > 1) & ((4 >= 3) & (x < 4)))", "s, (E[0,2](x > 1) & (x < 4))"),
+    ("s, !(((0 > 1) | (x > 2)) & (x < 3))", "s, !((x > 2) & (x < 3))"),
+])
+def test_absorbed_constants_keep_the_robustness(text, without):
+    x = Trace.fromarray(np.random.RandomState(0).uniform(0, 4, 20))
+    simplified = compile(simplify(parse(text)))(x)
+    np.testing.assert_allclose(simplified, compile(parse(without))(x))
+    np.testing.assert_array_equal(simplified >= 0, compile(parse(text))(x) >= 0)
+
+
+"""Merged always/eventually keep the values and the NaN tail of the nested formula"""
+@pytest.mark.parametrize("text", [
+    "s, G[2,5](G[1,2](x > 1))",
+    "s, E[2,5](E[1,2](x > 1))",
+    "s, E[2,5](E[0,2](x > 1))",
+    "s, G[0,3](G[2,4](G[1,1](x > 1)))",
+    "s, (G[1,2](G[3,3](x > 1)) | E[0,0](E[4,6](x < 2)))",
+])
+def test_merged_windows_keep_the_horizon(text):
+    x = Trace.fromarray(np.random.RandomState(0).uniform(0, 4, 22))
+    np.testing.assert_array_equal(compile(simplify(parse(text)))(x), compile(parse(text))(x))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from stlu_grammar import parse
+from stlu_compiler import compile
+from stlu_trace import Trace
+from stlu_smooth import smoothScore
+
+UNTIL = "s, U[a?0;6, b?4;12]((x > 0), (x > 2))"
+
+
+def trace(seed):
+    rng = np.random.RandomState(seed)
+    return Trace.fromarray(rng.uniform(-1, 4, 30))
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("name", ["a", "b"])
+def test_until_edge_gradient_matches_finite_difference(seed, name):
+    stl = parse(UNTIL)
+    x = trace(seed)
+    valuemap = {"a": 2.3, "b": 7.6}
+    (value, grads) = smoothScore(stl, x, valuemap, temperature=0.5, sharpness=3.0)
+    h = 1e-5
+    up = dict(valuemap, **{name: valuemap[name] + h})
+    down = dict(valuemap, **{name: valuemap[name] - h})
+    fd = (smoothScore(stl, x, up, temperature=0.5, sharpness=3.0)[0] - smoothScore(stl, x, down, temperature=0.5, sharpness=3.0)[0]) / (2 * h)
+    assert np.isfinite(value)
+    assert grads[name] == pytest.approx(fd, rel=1e-4, abs=1e-6)
+
+
+"""An edge moves the value by T * sharpness per time unit, the hard limit needs T -> 0 and T * sharpness -> inf"""
+@pytest.mark.parametrize("seed", range(5))
+def test_until_edges_approach_the_compiled_robustness(seed):
+    stl = parse(UNTIL)
+    x = trace(seed)
+    valuemap = {"a": 2.5, "b": 7.5}
+    hard = compile(stl)(x, valuemap)[0]
+    (value, _) = smoothScore(stl, x, valuemap, temperature=1e-3, sharpness=1e6)
+    assert value == pytest.approx(hard, abs=1e-2)
+
+
+"""A window starting after 0 is NaN at the end of the trace, a parametric branch beside it keeps its gradient"""
+@pytest.mark.parametrize("text", [
+    "s, (E[1,3](x > 1) & (y < d?0;2))",
+    "s, (G[1,3](x > 1) | (y < d?0;2))",
+    "s, (U[1,3]((x > 1), (x > 2)) & (y < d?0;2))",
+    "s, ((y < d?0;2) -> E[1,3](x > 1))",
+    "s, E[0,2]((E[1,3](x > 1) & (y < d?0;2)))",
+])
+def test_gradient_beside_a_cut_window(text):
+    stl = parse(text)
+    rng = np.random.RandomState(0)
+    x = Trace({"x": rng.uniform(0, 3, 20), "y": rng.uniform(0, 3, 20)})
+    (value, grads) = smoothScore(stl, x, {"d": 0.7})
+    h = 1e-6
+    fd = (smoothScore(stl, x, {"d": 0.7 + h})[0] - smoothScore(stl, x, {"d": 0.7 - h})[0]) / (2 * h)
+    assert np.isfinite(grads["d"])
+    assert grads["d"] == pytest.approx(fd, rel=1e-4, abs=1e-6)
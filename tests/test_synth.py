@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from stlu_grammar import parse
+from stlu_compiler import compile
+from stlu_trace import Trace
+from stlu_synth import synthSTLParam, getMonotoneDirs, paretoFront, analyticParams, bisectParams
+
+UNTIL = "s, U[0, b?0;20]((x > 0), (x > 2))"
+
+
+def spike():
+    x = np.ones(40)
+    x[10] = 3
+    return x
+
+
+"""Tightest satisfied b by scanning every integer value with the compiled robustness"""
+def scan(template, x):
+    plan = compile(parse(template))
+    trace = Trace.fromarray(x)
+    satisfied = [b for b in range(0, 21) if plan(trace, {"b": b})[0] >= 0]
+    return min(satisfied) if satisfied else None
+
+
+def test_until_upper_bound_is_contracted():
+    assert getMonotoneDirs(parse(UNTIL)) == {"b": -1}
+
+
+def test_until_lower_bound_is_rejected():
+    with pytest.raises(ValueError):
+        synthSTLParam("s, U[a?0;5, 20]((x > 0), (x > 2))", spike(), "bisect")
+
+
+def test_until_bisect_matches_scan():
+    (stlsyn, value, dur) = synthSTLParam(UNTIL, spike(), "bisect")
+    assert float(stlsyn.subformula.interval.right) == scan(UNTIL, spike()) == 10
+    assert value >= 0
+
+
+def test_until_bisect_matches_scan_random():
+    rng = np.random.default_rng(0)
+    for k in range(20):
+        x = rng.integers(0, 4, 40).astype(float)
+        expected = scan(UNTIL, x)
+        (stlsyn, value, dur) = synthSTLParam(UNTIL, x, "bisect")
+        if expected is None:
+            assert not value >= 0
+        else:
+            assert float(stlsyn.subformula.interval.right) == expected
+            assert value >= 0
+
+
+def test_until_pareto_front_is_tight():
+    assert paretoFront(UNTIL, spike()) == [{"b": 10.0}]
+
+
+def test_until_pareto_front_matches_scan():
+    template = "s, U[0, b?0;20]((x > 0), (x > c?0;3))"
+    x = spike()
+    plan = compile(parse(template))
+    trace = Trace.fromarray(x)
+    front = paretoFront(template, x)
+    for valuemap in front:
+        assert plan(trace, valuemap)[0] >= 0
+    # no satisfied grid point is strictly stronger (smaller b, larger c) than the whole front
+    for b in range(0, 21):
+        for c in np.linspace(0, 3, 13):
+            if plan(trace, {"b": b, "c": c})[0] >= 0:
+                assert any(v["b"] <= b and v["c"] >= c - 3.0 / 64 for v in front)
+
+
+@pytest.mark.parametrize("template", [
+    "s, G[0,10]((x < c?0;10))",
+    "s, E[0,5]((x > c?0;10))",
+    "s, G[0,8](E[0,3]((x > c?0;10)))",
+    "s, !(E[0,5]((x > c?0;10)))",
+    "s, G[0,10]((x < c?0;4))",
+])
+def test_analytic_matches_bisect(template):
+    stl = parse(template)
+    rng = np.random.RandomState(0)
+    for k in range(10):
+        evaluator = compile(stl).bind(Trace.fromarray(rng.uniform(1, 9, 30)))
+        analytic = analyticParams(stl, evaluator)
+        assert analytic["c"] == pytest.approx(bisectParams(stl, evaluator, 1e-6)["c"], abs=1e-5)
+
+
+def test_analytic_declines_other_shapes():
+    stl = parse("s, (G[0,10]((x < c?0;10)) & (x > 1))")
+    assert analyticParams(stl, compile(stl).bind(Trace.fromarray(np.ones(20)))) is None
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from stlu_grammar import parse, stl_generator
+from stlu_benchmark import to_requirement
+from stlu_chunked import requirement_horizon
+from stlu_node_robustness import umonitor, umonitor_signal, umonitor_batch, umonitor_sweep
+
+OPS = {"G": 1, "E": 1, "U": 1, "&": 1, "!": 1}
+
+
+def omega(seed, length=40):
+    rng = np.random.RandomState(seed)
+    return np.stack([np.cumsum(rng.normal(0, 0.3, length)), np.abs(rng.normal(0, 0.2, length))], axis=1)
+
+
+def corpus(n, depth):
+    return [stl_generator(depth, seed="umonitor-{}-{}".format(depth, i), ops=OPS, width=(0, 4), start=(0, 2),
+                          values=(0, 1), relops=(">", "<")) for i in range(n)]
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_signal_matches_pointwise(depth):
+    samples = omega(depth)
+    for text in corpus(10, depth):
+        requirement = to_requirement(parse(text), samples, 0.95)
+        signal = umonitor_signal(requirement)
+        defined = len(samples) - requirement_horizon(requirement)
+        pointwise = np.array([umonitor(requirement, t) for t in range(defined)])
+        np.testing.assert_allclose(signal[:defined], pointwise, err_msg=text)
+
+
+@pytest.mark.parametrize("depth", [1, 2])
+def test_batch_matches_each_trace(depth):
+    stack = np.stack([omega(seed) for seed in range(5)])
+    for text in corpus(5, depth):
+        requirement = to_requirement(parse(text), stack[0], 0.95)
+        batch = umonitor_batch(requirement, stack)
+        for n in range(len(stack)):
+            single = umonitor_signal(to_requirement(parse(text), stack[n], 0.95))
+            np.testing.assert_array_equal(batch[n], single, err_msg=text)
+
+
+def test_sweep_matches_each_confidence_level():
+    samples = omega(7)
+    cls = [0.5, 0.8, 0.95, 0.99]
+    for text in corpus(5, 2):
+        requirement = to_requirement(parse(text), samples, 0.95)
+        sweep = umonitor_sweep(requirement, cls)
+        for (k, cl) in enumerate(cls):
+            np.testing.assert_allclose(sweep[k], umonitor_signal(to_requirement(parse(text), samples, cl)), err_msg=text)
@@ -0,0 +1,48 @@
+import numpy as np
+from stlu_node_robustness import quan_to_boo
+from stlu_verdict import verdicts, verdict_names, verdict_counts, first_violation, longest_violation, dataset_report
+
+
+def bands(seed, shape):
+    rng = np.random.RandomState(seed)
+    lower = rng.normal(size=shape)
+    quan = np.stack([lower, lower + np.abs(rng.normal(size=shape))], axis=-1)
+    quan[rng.rand(*shape) < 0.1] = np.nan
+    return quan
+
+
+def test_verdicts_match_quan_to_boo():
+    quan = bands(0, (4, 50))
+    names = verdict_names(verdicts(quan))
+    assert names.shape == (4, 50)
+    assert all(names[n, t] == quan_to_boo(quan[n, t]) for n in range(4) for t in range(50))
+
+
+def test_counts_and_runs_match_a_loop():
+    quan = bands(1, (6, 40))
+    codes = verdicts(quan)
+    counts = verdict_counts(codes)
+    (length, start) = longest_violation(codes)
+    first = first_violation(codes)
+    for n in range(6):
+        names = [quan_to_boo(q) for q in quan[n]]
+        for name in set(names):
+            assert counts[name][n] == names.count(name)
+        violated = [t for t in range(40) if names[t] == "Strong Violation"]
+        assert first[n] == (violated[0] if violated else -1)
+        # longest run, the first one on ties
+        (best, run) = ((0, -1), 0)
+        for t in range(40):
+            run = run + 1 if names[t] == "Strong Violation" else 0
+            if run > best[0]:
+                best = (run, t - run + 1)
+        assert (length[n], start[n]) == best
+
+
+def test_dataset_report_totals():
+    data = {"a": bands(2, (3, 20)), "b": bands(3, (2, 20))}
+    report = dataset_report(data)
+    for (client, quan) in data.items():
+        names = [quan_to_boo(q) for q in quan.reshape(-1, 2)]
+        assert report[client]["totals"]["Strong Violation"] == names.count("Strong Violation")
+        assert len(report[client]["traces"]) == len(quan)
@@ -0,0 +1,55 @@
+import numpy as np
+import stlu_window
+from stlu_window import untilwindow, slidinguntil, timebounds, RangeIndex, slidingmin, slidingmax
+
+
+def columns(l, r, lo, hi):
+    return np.stack([stlu_window._dequeuntil(l[:, c].tolist(), r[:, c].tolist(), lo, hi) for c in range(l.shape[1])], axis=1)
+
+
+def test_batched_until_matches_deque(monkeypatch):
+    # tiles of a few rows, so most traces are cut into several tiles
+    monkeypatch.setattr(stlu_window, "_tilecells", 8)
+    rng = np.random.default_rng(0)
+    for k in range(200):
+        (T, C) = (int(rng.integers(1, 40)), int(rng.integers(1, 4)))
+        (l, r) = (rng.normal(size=(T, C)), rng.normal(size=(T, C)))
+        a = int(rng.integers(-5, 5))
+        b = a + int(rng.integers(0, 8))
+        vectorized = slidinguntil(l, r, a, b)
+        time = np.cumsum(rng.choice([0.3, 1.0, 2.5], T))
+        (lo, hi) = timebounds(time, a / 2.0, b / 2.0)
+        irregular = untilwindow(l, r, lo, hi)
+        monkeypatch.setattr(stlu_window, "_offsetwidth", -1)
+        assert np.array_equal(vectorized, slidinguntil(l, r, a, b), equal_nan=True)
+        assert np.array_equal(irregular, untilwindow(l, r, lo, hi), equal_nan=True)
+        monkeypatch.setattr(stlu_window, "_offsetwidth", 1024)
+
+
+def test_until_nan_window():
+    l = np.ones((6, 2))
+    r = np.zeros((6, 2))
+    l[3, 1] = np.nan
+    out = slidinguntil(l, r, 0, 2)
+    assert np.isnan(out[1:4, 1]).all() and not np.isnan(out[:4, 0]).any()
+
+
+def test_range_index_matches_slices():
+    rng = np.random.default_rng(1)
+    for k in range(50):
+        T = int(rng.integers(1, 70))
+        x = rng.normal(size=(T, 2)) if k % 2 else rng.normal(size=T)
+        index = RangeIndex(x)
+        lo = rng.integers(0, T + 1, 100)
+        hi = np.minimum(lo + rng.integers(-2, T + 1, 100), T)
+        for (query, reduce) in ((index.min, np.min), (index.max, np.max)):
+            expected = np.array([reduce(x[a:b], axis=0) if a < b else np.full(x.shape[1:], np.nan) for (a, b) in zip(lo, hi)])
+            assert np.array_equal(query(lo, hi), expected, equal_nan=True)
+
+
+def test_range_index_matches_sliding_windows():
+    x = np.random.default_rng(2).normal(size=50)
+    (lo, hi) = timebounds(np.arange(50.0), 2, 7)
+    index = RangeIndex(x)
+    assert np.array_equal(index.min(lo, hi), slidingmin(x, 2, 7), equal_nan=True)
+    assert np.array_equal(index.max(lo, hi), slidingmax(x, 2, 7), equal_nan=True)